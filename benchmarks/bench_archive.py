@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+'''
+Run a season-level query over many games, once by reparsing the timeline
+JSON of every game and once over the memory-mapped --archive_dir archive.
+
+    python benchmarks/bench_archive.py [--games 500]
+
+The games are synthetic timelines from bench_timeline.py, written into a
+temporary directory both as JSON and as an archive.
+'''
+from __future__ import absolute_import
+from __future__ import print_function
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import click
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import go  # noqa: E402
+from bench_timeline import synthetic_timeline  # noqa: E402
+from fixtures import fixture_match  # noqa: E402
+
+QUERY_MINUTE = 15
+
+
+def json_query(directory, games):
+    '''
+    The average gold lead of the blue side at QUERY_MINUTE, from JSON.
+    '''
+    leads = []
+    for game in games:
+        with io.open(os.path.join(directory, game + '.json'), 'rb') as f:
+            frames = json.loads(f.read().decode('utf-8'))['frames']
+        if len(frames) <= QUERY_MINUTE:
+            continue
+        participant_frames = frames[QUERY_MINUTE]['participantFrames']
+        leads.append(
+            sum(participant_frames[str(i)]['totalGold']
+                for i in range(1, 6)) -
+            sum(participant_frames[str(i)]['totalGold']
+                for i in range(6, 11)))
+    return sum(leads) / float(len(leads))
+
+
+def archive_query(directory):
+    '''
+    The same query over the archive.
+    '''
+    gold = np.stack(go.Archive(directory).select('gold', QUERY_MINUTE))
+    return float((gold[:, :5].sum(axis=1) - gold[:, 5:].sum(axis=1)).mean())
+
+
+@click.command()
+@click.option('--games', '-g', type=int, default=500)
+@click.option('--seed', type=int, default=0)
+def main(games, seed):
+    r = random.Random(seed)
+    directory = tempfile.mkdtemp()
+    json_dir = os.path.join(directory, 'json')
+    archive_dir = os.path.join(directory, 'archive')
+    os.makedirs(json_dir)
+    try:
+        names = []
+        json_size = 0
+        for i in range(games):
+            name = 'TEST-{0}'.format(i)
+            minutes = r.randint(20, 45)
+            body = synthetic_timeline(minutes, seed=i)
+            json_size += len(body)
+            with io.open(os.path.join(json_dir, name + '.json'), 'wb') as f:
+                f.write(body)
+            go.archive_game(
+                archive_dir, name, fixture_match(r, minutes * 60, False),
+                go.parse_timeline(json.loads(body.decode('utf-8'))))
+            names.append(name)
+        archive_size = sum(
+            os.path.getsize(os.path.join(root, f))
+            for root, _, files in os.walk(archive_dir) for f in files)
+        print('{0} games: {1:.1f} MB of JSON, {2:.1f} MB archived'.format(
+            games, json_size / 1048576.0, archive_size / 1048576.0))
+
+        results = []
+        for name, query in (
+                ('reparse JSON', lambda: json_query(json_dir, names)),
+                ('archive', lambda: archive_query(archive_dir))):
+            start = time.perf_counter()
+            results.append(query())
+            print('{0:<14} {1:10.2f} ms'.format(
+                name, (time.perf_counter() - start) * 1000))
+        print('Average blue gold lead at {0} minutes: {1:.1f}'.format(
+            QUERY_MINUTE, results[0]))
+        if abs(results[0] - results[1]) > 1e-6:
+            raise click.ClickException('The results do not match!')
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
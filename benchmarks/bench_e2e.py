@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+'''
+Run go.py end to end against standin.py, a local stand-in for ddragon, acs
+and the LPL APIs replaying recorded responses with injected latency, and
+report the wall time, time per stage, peak memory and requests of a single
+Riot game, an LPL BO5 and a batch of 100 games in 20 series.
+
+    python benchmarks/bench_e2e.py [--latency 0.05] [--jitter 0.02]
+    python benchmarks/bench_e2e.py --recordings DIR [--record]
+
+Without --recordings, synthetic recordings are generated into a temporary
+directory. Every run starts from a cold cache, and its output is checked
+against bench_e2e_golden.json (DIR/golden.json with --recordings), written
+by --update_golden. With --record, the scenarios in DIR/scenarios.json are
+fetched once from the live servers, signing in to Riot, and their
+responses recorded into DIR.
+'''
+from __future__ import absolute_import
+from __future__ import print_function
+import collections
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import go  # noqa: E402
+import standin  # noqa: E402
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__),
+                           'bench_e2e_golden.json')
+SCENARIOS = ('single', 'bo5', 'batch')
+
+
+def run_scenario(series, workers, adapter, sign_in=False):
+    '''
+    Render series (a list of lists of URLs) with a cold cache, through a
+    session whose requests all go to adapter. A single series is rendered
+    as go.py does, more as a --batch. Returns the output and the context.
+    '''
+    go.PROFILER = go.Profiler()
+    create_http_session = go.create_http_session
+    go.create_http_session = lambda workers, profile: standin.mount(
+        create_http_session(workers, profile), adapter)
+    directory = tempfile.mkdtemp()
+    try:
+        context = go.BoxContext(
+            workers, os.path.join(directory, 'cache'), 512, False, '')
+        # The recordings do not need the cookies of a Riot session.
+        context.riot_auth.signed_in = not sign_in
+        if len(series) == 1:
+            output = go.render_boxes(context, series[0], 1, ())
+        else:
+            output_dir = os.path.join(directory, 'boxes')
+            failed = go.run_batch(
+                context, [u' '.join(urls) for urls in series], 1, (),
+                output_dir)
+            if failed:
+                raise click.ClickException(
+                    '{0} series failed.'.format(len(failed)))
+            output = u''
+            for name in sorted(os.listdir(output_dir)):
+                if name.endswith('.txt'):
+                    with io.open(os.path.join(output_dir, name), 'r',
+                                 encoding='utf-8') as f:
+                        output += f.read()
+        return output, context
+    finally:
+        go.create_http_session = create_http_session
+        shutil.rmtree(directory)
+
+
+def digest(output):
+    return hashlib.sha1(output.encode('utf-8')).hexdigest()
+
+
+def report(name, series, elapsed, peak, context, profiler, requests):
+    stages = profiler.stages
+    print('{0}: {1} series, {2} games, {3:.3f}s wall, '
+          'peak {4:.1f} MB, {5} requests, {6} hedged'.format(
+              name, len(series), stages['output match result'][0],
+              elapsed, peak / 1048576.0, sum(requests.values()),
+              context.hedger.hedged))
+    for stage, (calls, seconds) in stages.items():
+        print('  {0:<24}{1:>6}{2:>9.3f}s'.format(stage, calls, seconds))
+    for host, count in sorted(requests.items()):
+        print('  {0:<40}{1:>6}'.format(host, count))
+
+
+@click.command()
+@click.option('--scenario', '-s', type=click.Choice(SCENARIOS),
+              multiple=True, help='Default: all of them')
+@click.option('--latency', type=float, default=0.05,
+              help='Seconds before each response. Default: 0.05')
+@click.option('--jitter', type=float, default=0.02,
+              help='Up to this many seconds more at random. Default: 0.02')
+@click.option('--workers', '-w', type=click.IntRange(min=1), default=4)
+@click.option('--repeat', '-r', type=click.IntRange(min=1), default=3,
+              help='Runs timed per scenario, the median is reported.')
+@click.option('--recordings', type=click.Path(file_okay=False),
+              help='Replay the recordings in this directory.')
+@click.option('--record', is_flag=True,
+              help='Record the scenarios of --recordings from the live '
+                   'servers first.')
+@click.option('--update_golden', is_flag=True)
+def main(scenario, latency, jitter, workers, repeat, recordings, record,
+         update_golden):
+    if record and not recordings:
+        raise click.UsageError('--record needs --recordings.')
+    # The dates of the boxes are in local time.
+    os.environ['TZ'] = 'UTC'
+    time.tzset()
+    directory = recordings or tempfile.mkdtemp()
+    golden_path = (os.path.join(recordings, 'golden.json') if recordings
+                   else GOLDEN_PATH)
+    go_print = go.print if hasattr(go, 'print') else None
+    try:
+        if recordings:
+            replay = standin.Recordings(recordings)
+        else:
+            replay = standin.write_synthetic_recordings(directory)
+        scenarios = replay.scenarios()
+        if record:
+            for name in scenario or SCENARIOS:
+                run_scenario(scenarios[name], workers,
+                             standin.RecordingAdapter(replay), sign_in=True)
+            replay.save()
+        golden = {}
+        if os.path.exists(golden_path) and not update_golden:
+            with io.open(golden_path, 'r', encoding='utf-8') as f:
+                golden = json.load(f)
+
+        # Keep the progress messages of go.py out of the timing.
+        go.print = lambda *args, **kwargs: None
+        digests = collections.OrderedDict()
+        with standin.StandInServer(replay, latency, jitter) as server:
+            pool_size = max(go.HTTP_POOL_SIZE,
+                            workers * go.REQUESTS_PER_GAME)
+            for name in scenario or SCENARIOS:
+                series = scenarios[name]
+                timings = []
+                for _ in range(repeat):
+                    server.reset()
+                    adapter = standin.StandInAdapter(
+                        server.port, pool_maxsize=pool_size)
+                    start = time.perf_counter()
+                    output, context = run_scenario(series, workers, adapter)
+                    timings.append(time.perf_counter() - start)
+                    requests = collections.Counter(server.requests)
+                    profiler = go.PROFILER
+                # Memory is traced in one more run, as tracing slows it.
+                tracemalloc.start()
+                run_scenario(series, workers, standin.StandInAdapter(
+                    server.port, pool_maxsize=pool_size))
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                if server.missing:
+                    raise click.ClickException(
+                        'Not recorded: {0}'.format(server.missing[0]))
+                report(name, series, sorted(timings)[len(timings) // 2],
+                       peak, context, profiler, requests)
+                digests[name] = digest(output)
+                if name in golden and golden[name] != digests[name]:
+                    raise click.ClickException(
+                        'The output of {0} differs from {1}!'.format(
+                            name, golden_path))
+    finally:
+        if go_print is None:
+            go.__dict__.pop('print', None)
+        else:
+            go.print = go_print
+        if not recordings:
+            shutil.rmtree(directory)
+    if update_golden:
+        with io.open(golden_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(digests, indent=1) + u'\n')
+        print('Wrote {0}'.format(golden_path))
+    elif golden:
+        print('Output identical to {0}.'.format(golden_path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark output_match_result on thousands of fixture games, and check its
+output is byte-for-byte identical to the original += renderer kept below.
+
+    python benchmarks/bench_render.py [--games 5000]
+'''
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import random
+import sys
+import time
+
+import click
+from kitchen.text.display import textual_width_fill
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import go  # noqa: E402
+from fixtures import fixture_match  # noqa: E402
+
+CHAMPIONS = dict(
+    (i, random.Random(i).choice([
+        u'\u5384\u85a9\u65af', u'\u963f\u7483', u'\u5361\u871c\u5152',
+        u'\u5e03\u90ce\u59c6', u'\u827e\u59ae\u7dad\u4e9e',
+        u'\u96f7\u514b\u585e', u'Jhin']))
+    for i in range(1, 200))
+CHAMPIONS[-1] = u'(\u7121)'
+
+
+def legacy_stats_first(player):
+    return u'{0} {1:>2}/{2:>2}/{3:>2} {4:>4} {5:>5}k'.format(
+        textual_width_fill(player.name, 16),
+        player.kills, player.deaths, player.assists, player.cs,
+        round(player.gold / 100.00) / 10)
+
+
+def legacy_stats_second(player, champions, max_damage):
+    return u'{0} {1}  {2:>6}'.format(
+        textual_width_fill(champions[player.champion_id], 16),
+        go.bar_chart(round(player.damage * 48.00 / max_damage)),
+        player.damage
+    )
+
+
+def legacy_output_match_result(match, game_number, short_url, champions):
+
+    output = ''
+    blue, red = match.blue, match.red
+    blue_players, red_players = match.players[:5], match.players[5:]
+    m, s = divmod(match.duration, 60)
+    duration = '{0:02d}:{1:02d}'.format(m, s)
+    blue_result = go.VICTORY_MSG if blue.win else go.DEFEAT_MSG
+    red_result = go.VICTORY_MSG if red.win else go.DEFEAT_MSG
+    blue_bans = [champions[ban] if ban else '' for ban in blue.bans]
+    red_bans = [champions[ban] if ban else '' for ban in red.bans]
+    if match.lpl:
+        blue_dragons = '{0:<32}'.format(blue.dragons)
+        red_dragons = red.dragons
+    else:
+        blue_dragons = u''.join(
+            go.color_dragon(dragon) for dragon in blue.dragons)
+        blue_dragons += ' ' * (32 - len(blue.dragons) * 2)
+        red_dragons = u''.join(go.color_dragon(dragon) for dragon in red.dragons)
+    max_damage = max(player.damage for player in match.players)
+
+    # Output the result line-by-line.
+    output += (u'\x1b[1;37;46mGame {0:>2}\x1b[m ' +
+               (u'\u2500' * 15) + u'\u252c' + (u'\u2500' * 13) +
+               ' {1}\n').format(game_number, match.date)
+
+    blue_team_spaces = 12 - len(blue.name) // 2
+    red_team_spaces = 12 - len(red.name) // 2
+
+    output += (u'{0}\x1b[1;37;44m{1}\x1b[m{2}{3:>6}    '
+               u'\x1b[1;36;40m{4:>2}\x1b[m'
+               u'  \u2502  \x1b[1;31;40m{5:>2}\x1b[m    '
+               u'{6:<6}{7}\x1b[1;37;41m{8}\x1b[m\n').format(
+        ' ' * blue_team_spaces, blue.name,
+        ' ' * (24 - blue_team_spaces - len(blue.name)),
+        go.format_golds(blue_players),
+        sum(player.kills for player in blue_players),
+        sum(player.kills for player in red_players),
+        go.format_golds(red_players),
+        ' ' * red_team_spaces, red.name)
+    if match.lpl:
+        output += u'{0}{1}{2}{3}  \u2502  {4}{5}{6}\n'.format(
+            ' ' * 8, blue_result, ' ' * 9, ' ' * 11,
+            duration, ' ' * 15, red_result)
+    else:
+        output += u'{0}{1}{2}PATCH{3:>6}  \u2502  {4}{5}{6}\n'.format(
+            ' ' * 8, blue_result, ' ' * 9, match.patch,
+            duration, ' ' * 15, red_result)
+    output += (u'\u2500' * 19) + u'\u253c' + (u'\u2500' * 19) + '\n'
+    output += u'{0} \u2502 {0}\n'.format(
+        ' ' * 18 + '\x1b[1;37;40mK  D  A   CS  $/Dmg\x1b[m')
+
+    # Iterrate through all players in the game.
+    for blue_player, red_player in zip(blue_players, red_players):
+        output += (u'\x1b[1;36;40m{0}\x1b[m \u2502 '
+                   u'\x1b[1;31;40m{1}\x1b[m\n').format(
+            legacy_stats_first(blue_player),
+            legacy_stats_first(red_player),
+        )
+        output += (u'{0} \u2502 {1}\n').format(
+            legacy_stats_second(blue_player, champions, max_damage),
+            legacy_stats_second(red_player, champions, max_damage),
+        )
+
+    output += (u'\u2500' * 19) + u'\u253c' + (u'\u2500' * 19) + '\n'
+
+    # Stats like Bans, picks, dragons, barons.
+    output += u'{0} {1} {2} {3} \u2502 {0} {4} {5} {6}\n'.format(
+        u'\u7981\u7528',
+        textual_width_fill(blue_bans[0], 10),
+        textual_width_fill(blue_bans[1], 10),
+        textual_width_fill(blue_bans[2], 10),
+        textual_width_fill(red_bans[0], 10),
+        textual_width_fill(red_bans[1], 10),
+        textual_width_fill(red_bans[2], 10),
+        )
+    output += u'{0} {1} {2} {3} \u2502 {0} {4} {5}\n'.format(
+        ' ' * 4,
+        textual_width_fill(blue_bans[3], 10),
+        textual_width_fill(blue_bans[4], 10),
+        ' ' * 10,
+        textual_width_fill(red_bans[3], 10),
+        textual_width_fill(red_bans[4], 10),
+        )
+    output += u'{0} {1} \u2502 {0} {2}\n'.format(
+        u'\u5c0f\u9f8d', blue_dragons, red_dragons
+    )
+    if match.lpl:
+        output += (u'{0:>2} \u5854 / {1:>2} \u5df4\u9f8d{2}').format(
+            blue.towers,
+            blue.barons,
+            ' ' * 22
+        )
+        output += u' \u2502 '
+        output += (u'{0:>2} \u5854 / {1:>2} \u5df4\u9f8d\n').format(
+            red.towers,
+            red.barons,
+        )
+    else:
+        output += (u'{0:>2} \u5854 / {1} \u5175\u71df / '
+                   u'{2} \u9810\u793a\u8005 / {3:>2} \u5df4\u9f8d  ').format(
+            blue.towers,
+            blue.inhibitors,
+            blue.heralds,
+            blue.barons,
+        )
+        output += u' \u2502 '
+        output += (u'{0:>2} \u5854 / {1} \u5175\u71df / '
+                   u'{2} \u9810\u793a\u8005 / {3:>2} \u5df4\u9f8d\n').format(
+            red.towers,
+            red.inhibitors,
+            red.heralds,
+            red.barons,
+        )
+    if short_url:
+        output += ((u'\u2500' * 19) + u'\u2534' +
+                   (u'\u2500' * 6) + '{0:>26}\n\n').format(
+            short_url)
+    else:
+        output += (u'\u2500' * 19) + u'\u2534' + (u'\u2500' * 19) + '\n\n'
+    return output
+
+
+def render_all(render, games):
+    return [render(match, number, short_url, CHAMPIONS)
+            for match, number, short_url in games]
+
+
+@click.command()
+@click.option('--games', '-g', type=click.IntRange(min=1), default=5000)
+@click.option('--seed', type=int, default=0)
+def main(games, seed):
+    r = random.Random(seed)
+    fixtures = [
+        (fixture_match(r), i % 5 + 1,
+         r.choice(['', 'https://bit.ly/2Lz8Q3x']))
+        for i in range(games)
+    ]
+    # Keep the progress messages of go.py out of the timing.
+    go_print = go.print if hasattr(go, 'print') else None
+    go.print = lambda *args, **kwargs: None
+    try:
+        timings = []
+        outputs = []
+        for name, render in (('legacy', legacy_output_match_result),
+                             ('current', go.output_match_result)):
+            start = time.perf_counter()
+            outputs.append(u''.join(render_all(render, fixtures)))
+            timings.append(time.perf_counter() - start)
+            print('{0:<8} {1:8.1f} ms  {2:6.1f} us/game'.format(
+                name, timings[-1] * 1000, timings[-1] * 1e6 / games))
+    finally:
+        if go_print is None:
+            del go.print
+        else:
+            go.print = go_print
+    if outputs[0] != outputs[1]:
+        raise click.ClickException('The outputs are different!')
+    print('Identical output, {0} bytes, {1:.2f}x speed.'.format(
+        len(outputs[1].encode('utf-8')), timings[0] / timings[1]))
+
+
+if __name__ == '__main__':
+    main()
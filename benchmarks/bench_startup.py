@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+'''
+Measure the start-up time of go.py and check it against the budget.
+
+    python benchmarks/bench_startup.py [--runs 10] [--budget 150]
+
+Each run starts `python -X importtime go.py --help`. The wall time is
+taken from the median run, and the import time is the sum of the top-level
+imports made by go.py itself (the interpreter's own site imports excluded).
+It exits with an error when the median wall time is over the budget.
+'''
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import subprocess
+import sys
+import time
+
+import click
+
+GO_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                     os.pardir, 'go.py')
+# Keep in sync with the README.
+STARTUP_BUDGET_MS = 150
+# Imported by the interpreter before go.py starts.
+INTERPRETER_IMPORTS = ('site', 'encodings', 'zipimport', 'io', '_signal',
+                       '_frozen_importlib_external', 'encodings.utf_8')
+
+
+def run_once():
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', GO_PY, '--help'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    _, stderr = proc.communicate()
+    elapsed = time.perf_counter() - start
+    if proc.returncode:
+        raise click.ClickException(stderr.decode('utf-8', 'replace'))
+    imports = []
+    for line in stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Only top-level imports, nested ones are in their cumulative time.
+        if name.startswith('  ') or name.strip() in INTERPRETER_IMPORTS:
+            continue
+        imports.append((int(cumulative), name.strip()))
+    return elapsed, imports
+
+
+@click.command()
+@click.option('--runs', '-r', type=click.IntRange(min=1), default=10)
+@click.option('--budget', '-b', type=int, default=STARTUP_BUDGET_MS,
+              help='The start-up budget in ms. Default: {0}'.format(
+                  STARTUP_BUDGET_MS))
+@click.option('--top', type=int, default=10,
+              help='How many of the slowest imports to show.')
+def main(runs, budget, top):
+    results = sorted((run_once() for _ in range(runs)), key=lambda r: r[0])
+    elapsed, imports = results[len(results) // 2]
+    print('go.py --help, median of {0} runs:'.format(runs))
+    print('  wall time   {0:7.1f} ms'.format(elapsed * 1000))
+    print('  import time {0:7.1f} ms'.format(
+        sum(us for us, _ in imports) / 1000.0))
+    print('Slowest top-level imports:')
+    for us, name in sorted(imports, reverse=True)[:top]:
+        print('  {0:7.1f} ms  {1}'.format(us / 1000.0, name))
+    if elapsed * 1000 > budget:
+        raise click.ClickException(
+            'Start-up took {0:.1f} ms, over the {1} ms budget.'.format(
+                elapsed * 1000, budget))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+'''
+Compare the full-parse and the streaming dragon extraction of a timeline,
+and the full parse into arrays done for --graph (with the graph rendered).
+
+    python benchmarks/bench_timeline.py [TIMELINE_JSON]
+
+Without a file, a synthetic 45 minutes timeline of a similar shape and size
+as the acs one is used.
+'''
+from __future__ import absolute_import
+from __future__ import print_function
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import go  # noqa: E402
+
+DRAGON_SUB_TYPES = ['FIRE_DRAGON', 'WATER_DRAGON', 'AIR_DRAGON',
+                    'EARTH_DRAGON']
+
+
+def synthetic_timeline(minutes=45, seed=0):
+    r = random.Random(seed)
+    frames = []
+    for minute in range(minutes + 1):
+        participant_frames = dict(
+            (str(p), {
+                'participantId': p,
+                'position': {'x': r.randint(0, 14870),
+                             'y': r.randint(0, 14881)},
+                'currentGold': r.randint(0, 3000),
+                'totalGold': 500 + minute * r.randint(300, 450),
+                'level': min(18, 1 + minute // 2),
+                'xp': minute * r.randint(400, 600),
+                'minionsKilled': minute * r.randint(4, 9),
+                'jungleMinionsKilled': minute * r.randint(0, 5),
+                'dominionScore': 0,
+                'teamScore': 0,
+            }) for p in range(1, 11))
+        events = []
+        for _ in range(r.randint(20, 60)):
+            events.append({
+                'type': r.choice(['ITEM_PURCHASED', 'SKILL_LEVEL_UP',
+                                  'WARD_PLACED', 'ITEM_DESTROYED']),
+                'timestamp': minute * 60000 + r.randint(0, 59999),
+                'participantId': r.randint(1, 10),
+                'itemId': r.randint(1001, 3900),
+            })
+        if minute % 6 == 5:
+            events.append({
+                'type': 'ELITE_MONSTER_KILL',
+                'timestamp': minute * 60000 + r.randint(0, 59999),
+                'position': {'x': 9866, 'y': 4414},
+                'killerId': r.randint(1, 10),
+                'monsterType': 'DRAGON',
+                'monsterSubType': r.choice(DRAGON_SUB_TYPES),
+            })
+        frames.append({'participantFrames': participant_frames,
+                       'events': events, 'timestamp': minute * 60000})
+    return json.dumps({'frames': frames, 'frameInterval': 60000}).encode(
+        'utf-8')
+
+
+def full_parse(body):
+    timeline = json.loads(body.decode('utf-8'))
+    return [
+        (event['killerId'], event['monsterSubType'])
+        for frame in timeline['frames']
+        for event in frame['events']
+        if event.get('monsterType', '') == 'DRAGON'
+    ]
+
+
+def streaming_parse(body):
+    chunk_size = go.RESPONSE_CHUNK_SIZE
+    return go.get_dragon_kills(
+        body[i:i + chunk_size] for i in range(0, len(body), chunk_size))
+
+
+def graph_parse(body):
+    timeline = go.parse_timeline(json.loads(body.decode('utf-8')))
+    go.gold_graph(timeline, len(timeline.timestamps) * 60)
+    return timeline.dragon_kills
+
+
+def measure(func, body, repeat):
+    tracemalloc.start()
+    result = func(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(body)
+    elapsed = (time.perf_counter() - start) / repeat
+    return result, elapsed, peak
+
+
+@click.command()
+@click.option('--repeat', '-r', type=int, default=50)
+@click.argument('timeline', type=click.File('rb'), required=False)
+def main(repeat, timeline):
+    body = timeline.read() if timeline else synthetic_timeline()
+    print('Timeline size: {0:.1f} KB'.format(len(body) / 1024.0))
+    results = []
+    for name, func in (('full parse', full_parse),
+                       ('streaming', streaming_parse),
+                       ('graph', graph_parse)):
+        result, elapsed, peak = measure(func, body, repeat)
+        results.append(result)
+        print('{0:<12} {1:8.2f} ms  peak {2:8.1f} KB'.format(
+            name, elapsed * 1000, peak / 1024.0))
+    if any(result != results[0] for result in results):
+        raise click.ClickException('Dragon kills do not match!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+'''
+Validate go.py's display-width engine against kitchen, and time both.
+
+    python benchmarks/check_width.py [--cache_dir DIR] [--fetch]
+
+The names checked are the zh_TW champion list (from the champion cache, or
+from Data Dragon with --fetch) and a set of CJK / emoji summoner names. It
+exits with an error on any difference. Differences over the whole Unicode
+range are only reported, as kitchen's combining table is from an older
+Unicode version than unicodedata.
+'''
+from __future__ import absolute_import
+from __future__ import print_function
+import glob
+import os
+import sys
+import time
+
+import click
+from kitchen.text import display
+import six
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import go  # noqa: E402
+
+SUMMONER_NAMES = [
+    u'FW Maple', u'AHQ 小天', u'閃電狼 Karsa',
+    u'KZ 피릭', u'RNG 香锅', u'DFM Evi',
+    u'テスト名前', u'ＦＷ　Ｍａｐ',
+    u'SKT Faker\U0001F409', u'\U0001F600\U0001F602 smile', u'Zoë',
+    u'Café', u'สวัสดี',
+    u'\U00020000\U0002a6d6', u'\u200bzero width', u'',
+]
+FILLS = (10, 16)
+
+
+def load_champion_names(cache_dir, fetch):
+    if fetch:
+        return list(six.itervalues(
+            go.get_champions(go.create_http_session(1))))
+    paths = sorted(glob.glob(os.path.join(cache_dir, 'champions-*.json')))
+    if not paths:
+        raise click.ClickException(
+            'No cached champion data in {0}, use --fetch.'.format(cache_dir))
+    print('Using {0}'.format(paths[-1]))
+    return list(six.itervalues(go.read_json_file(paths[-1])))
+
+
+def time_fill(fill_func, names, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for name in names:
+            for fill in FILLS:
+                fill_func(name, fill)
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option('--cache_dir', type=click.Path(file_okay=False),
+              default=go.DEFAULT_CACHE_DIR)
+@click.option('--fetch', is_flag=True,
+              help='Fetch the latest champion list instead of the cache.')
+@click.option('--repeat', '-r', type=int, default=200)
+def main(cache_dir, fetch, repeat):
+    names = load_champion_names(cache_dir, fetch) + SUMMONER_NAMES
+    mismatches = [
+        (name, fill) for name in names for fill in FILLS
+        if go.textual_width_fill(name, fill) !=
+        display.textual_width_fill(name, fill)
+    ]
+    for name, fill in mismatches:
+        print(u'Mismatch: {0!r} fill {1}'.format(name, fill))
+    print('{0} names checked, {1} mismatches.'.format(
+        len(names), len(mismatches)))
+
+    code_points = [
+        ucs for ucs in range(0x110000)
+        if go._code_point_width(ucs) != display._ucp_width(ucs)
+    ]
+    print('{0} code points differ from kitchen in the whole range.'.format(
+        len(code_points)))
+
+    kitchen_time = time_fill(display.textual_width_fill, names, repeat)
+    go_time = time_fill(go.textual_width_fill, names, repeat)
+    print('kitchen {0:8.1f} ms, go.py {1:8.1f} ms ({2:.1f}x)'.format(
+        kitchen_time * 1000, go_time * 1000, kitchen_time / go_time))
+    if mismatches:
+        raise click.ClickException('The widths are different from kitchen.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+'''
+Random matches shared by the benchmarks, with the names, bans and dragons
+that make rendering them slow: CJK, Hangul and emoji names, missing bans
+and LPL dragon strings.
+'''
+from __future__ import absolute_import
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import go  # noqa: E402
+
+NAMES = [u'FW Maple', u'FW Karsa', u'RNG Uzi', u'AHQ \u5c0f\u5929',
+         u'KZ \ud55c\uad6d\uc5b4', u'G2 Perkz', u'SKT Faker\U0001F409',
+         u'LMS \u9ed1\u8272\u73ab\u7470\u7247', u'x', u'A Very Long Summoner']
+TEAMS = [u'', u'FW', u'Flash Wolves', u'Royal Never Give Up',
+         u'\u9583\u96fb\u72fc']
+DRAGONS = ['FIRE_DRAGON', 'WATER_DRAGON', 'AIR_DRAGON', 'EARTH_DRAGON',
+           'ELDER_DRAGON']
+
+
+def fixture_match(r, duration=None, lpl=None):
+    '''
+    A random match from the random.Random r. The duration in seconds and
+    whether it is an LPL game are random unless given.
+    '''
+    if lpl is None:
+        lpl = r.random() < 0.3
+    players = tuple(
+        go.Player(r.choice(NAMES), r.randint(1, 199), r.randint(0, 15),
+                  r.randint(0, 12), r.randint(0, 25), r.randint(0, 450),
+                  r.randint(4000, 20000), r.randint(1000, 60000))
+        for _ in range(10))
+    sides = []
+    for i in range(2):
+        bans = [r.choice([-1, 0] + list(range(1, 200)))
+                for _ in range(r.randint(0, 5))]
+        if lpl:
+            dragons = r.choice([u'', u'\u706b\u6c34', u'3'])
+        else:
+            dragons = tuple(r.choice(DRAGONS) for _ in range(r.randint(0, 5)))
+        sides.append(go.Team(
+            r.choice(TEAMS), i == 0, bans, dragons, r.randint(0, 11),
+            r.randint(0, 4), r.randint(0, 2), r.randint(0, 3)))
+    if duration is None:
+        duration = r.randint(900, 3600)
+    return go.Match('2019-05-{0:02d}'.format(r.randint(1, 31)),
+                    duration, '' if lpl else '9.10', lpl,
+                    sides[0], sides[1], players)
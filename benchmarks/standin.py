@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+'''
+A local stand-in for ddragon, acs and the LPL APIs, replaying recorded
+responses with injected latency, for bench_e2e.py.
+
+A recordings directory holds index.json, mapping each URL to the file of
+its body (and its status and content type), the body files, and
+scenarios.json with the inputs of the benchmark scenarios. It is either
+generated by write_synthetic_recordings, or recorded from the live servers
+with RecordingAdapter (bench_e2e.py --record).
+'''
+from __future__ import absolute_import
+from __future__ import print_function
+import collections
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+from six.moves.urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_timeline import synthetic_timeline  # noqa: E402
+
+# The champions of the synthetic games: id, zh_TW name.
+CHAMPIONS = {
+    'Aatrox': ('266', u'厄薩斯'), 'Ahri': ('103', u'阿璃'),
+    'Akali': ('84', u'阿卡莉'), 'Alistar': ('12', u'亞歷斯塔'),
+    'Amumu': ('32', u'阿姆姆'), 'Anivia': ('34', u'艾妮維亞'),
+    'Annie': ('1', u'安妮'), 'Ashe': ('22', u'艾希'),
+    'Bard': ('432', u'巴德'), 'Blitzcrank': ('53', u'布里茨'),
+    'Brand': ('63', u'布蘭德'), 'Braum': ('201', u'布郎姆'),
+    'Caitlyn': ('51', u'凱特琳'), 'Camille': ('164', u'卡蜜兒'),
+    'Cassiopeia': ('69', u'卡莎碧雅'),
+}
+CHAMPION_IDS = sorted(int(key) for key, _ in CHAMPIONS.values())
+SUMMONER_NAMES = [u'FW Maple', u'FW Karsa', u'FW Betty', u'FW 小天',
+                  u'FW Moojin', u'RNG Letme', u'RNG Mlxg', u'RNG 香锅',
+                  u'RNG Uzi', u'RNG 🐉Z']
+LPL_TEAMS = {'1': 'RNG', '2': 'EDG'}
+PATCH = '10.1.1'
+
+
+def _recording_name(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest() + '.body'
+
+
+class Recordings(object):
+    '''
+    The recorded responses of a directory, by URL.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        index_path = os.path.join(directory, 'index.json')
+        self.index = {}
+        if os.path.exists(index_path):
+            with io.open(index_path, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+
+    def get(self, url):
+        '''
+        Return (status, content type, body) of url, None if not recorded.
+        '''
+        entry = self.index.get(url)
+        if entry is None:
+            return None
+        with io.open(os.path.join(self.directory, entry['file']), 'rb') as f:
+            return entry['status'], entry['content_type'], f.read()
+
+    def add(self, url, status, content_type, body):
+        name = _recording_name(url)
+        with io.open(os.path.join(self.directory, name), 'wb') as f:
+            f.write(body)
+        with self._lock:
+            self.index[url] = {'file': name, 'status': status,
+                               'content_type': content_type}
+
+    def save(self):
+        with io.open(os.path.join(self.directory, 'index.json'), 'w',
+                     encoding='utf-8') as f:
+            f.write(json.dumps(self.index, indent=1, sort_keys=True))
+
+    def scenarios(self):
+        with io.open(os.path.join(self.directory, 'scenarios.json'), 'r',
+                     encoding='utf-8') as f:
+            return json.load(f)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StandInServer(object):
+    '''
+    Serve recordings on 127.0.0.1 at a free port. Each response is sent
+    after latency seconds, plus up to jitter seconds at random. Requests
+    are counted by host, and the URLs not recorded answer 404.
+    '''
+
+    def __init__(self, recordings, latency=0.0, jitter=0.0, seed=0):
+        self.recordings = recordings
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = collections.Counter()
+        self.missing = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                standin.handle(self)
+
+            do_PUT = do_GET
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = _ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            del self.missing[:]
+
+    def handle(self, handler):
+        # The path is /<scheme>/<host>/<path>, see StandInAdapter.
+        scheme, _, rest = handler.path.lstrip('/').partition('/')
+        url = '{0}://{1}'.format(scheme, rest)
+        with self._lock:
+            self.requests[urlsplit(url).netloc] += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        time.sleep(delay)
+        recorded = self.recordings.get(url)
+        if recorded is None:
+            with self._lock:
+                self.missing.append(url)
+            status, content_type, body = 404, 'text/plain', b'Not recorded'
+        else:
+            status, content_type, body = recorded
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+class StandInAdapter(HTTPAdapter):
+    '''
+    Send every request of a session to a StandInServer instead, as
+    http://127.0.0.1:<port>/<scheme>/<host>/<path>.
+    '''
+
+    def __init__(self, port, **kwargs):
+        self.port = port
+        super(StandInAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = 'http://127.0.0.1:{0}/{1}/{2}{3}{4}'.format(
+            self.port, parts.scheme, parts.netloc, parts.path,
+            '?' + parts.query if parts.query else '')
+        return super(StandInAdapter, self).send(request, **kwargs)
+
+
+class RecordingAdapter(HTTPAdapter):
+    '''
+    Send requests to the live servers, and add each response to
+    recordings.
+    '''
+
+    def __init__(self, recordings, **kwargs):
+        self.recordings = recordings
+        super(RecordingAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        kwargs['stream'] = False
+        response = super(RecordingAdapter, self).send(request, **kwargs)
+        if request.method == 'GET':
+            self.recordings.add(
+                request.url, response.status_code,
+                response.headers.get('Content-Type', ''), response.content)
+        return response
+
+
+def mount(session, adapter):
+    '''
+    Mount adapter for every URL of session, over its own adapters.
+    '''
+    session.adapters.clear()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def synthetic_match(seed, minutes):
+    r = random.Random(seed)
+    participants = []
+    for i in range(10):
+        participants.append({
+            'participantId': i + 1,
+            'championId': CHAMPION_IDS[i],
+            'stats': {
+                'kills': r.randint(0, 12),
+                'deaths': r.randint(0, 9),
+                'assists': r.randint(0, 20),
+                'totalMinionsKilled': r.randint(20, 400),
+                'neutralMinionsKilled': r.randint(0, 150),
+                'goldEarned': r.randint(5000, 19000),
+                'totalDamageDealtToChampions': r.randint(2000, 40000),
+            },
+        })
+    teams = []
+    for t in range(2):
+        teams.append({
+            'teamId': 100 * (t + 1),
+            'win': 'Win' if t == seed % 2 else 'Fail',
+            'bans': [{'championId': CHAMPION_IDS[10 + k], 'pickTurn': k}
+                     for k in range(r.randint(3, 5))],
+            'towerKills': r.randint(0, 11),
+            'inhibitorKills': r.randint(0, 3),
+            'riftHeraldKills': r.randint(0, 1),
+            'baronKills': r.randint(0, 2),
+        })
+    return {
+        'gameId': seed,
+        'gameVersion': '10.1.301.1234',
+        'gameDuration': minutes * 60 + r.randint(0, 59),
+        'gameCreation': 1578000000000 + seed % 1000 * 3600000,
+        'participantIdentities': [
+            {'participantId': i + 1,
+             'player': {'summonerName': SUMMONER_NAMES[i]}}
+            for i in range(10)],
+        'participants': participants,
+        'teams': teams,
+    }
+
+
+def synthetic_lpl_match(match_id):
+    r = random.Random(match_id)
+
+    def side(offset):
+        data = {
+            'players': [{
+                'name': u'{0} 選手{1}'.format(
+                    LPL_TEAMS['1' if offset == 0 else '2'], i),
+                'hero': str(CHAMPION_IDS[offset + i]),
+                'kill': str(r.randint(0, 9)),
+                'death': str(r.randint(0, 9)),
+                'assist': str(r.randint(0, 9)),
+                'lasthit': str(r.randint(0, 300)),
+                'gold': str(r.randint(5000, 15000)),
+                'totalDamageToChamp': str(r.randint(1000, 30000)),
+            } for i in range(5)],
+            's-dragon': u'火水',
+            'tower': str(r.randint(0, 11)),
+            'b-dragon': str(r.randint(0, 2)),
+        }
+        for i in range(1, 6):
+            data['ban-hero-{0}'.format(i)] = str(
+                CHAMPION_IDS[9 + i] if i < 5 else 0)
+        return data
+
+    battle_data = {
+        'game-period': str(r.randint(1500, 2700)),
+        'game-date': '2020-01-{0:02d}'.format(match_id % 28 + 1),
+        'left': side(0),
+        'right': side(5),
+        'game-win': 'left' if match_id % 2 else 'right',
+    }
+    return {'status': '0', 'msg': {
+        'sMatchInfo': {'BlueTeam': '1', 'TeamA': '1', 'TeamB': '2'},
+        'battleInfo': {'BattleData': json.dumps(
+            battle_data, ensure_ascii=False)},
+    }}
+
+
+def _jsonp(name, data):
+    return u'var {0}={1};'.format(
+        name, json.dumps(data, ensure_ascii=False)).encode('utf-8')
+
+
+def write_synthetic_recordings(directory, seed=0):
+    '''
+    Write the recordings of synthetic games into directory, with the
+    scenarios: a single Riot game, an LPL BO5, and a batch of 100 games in
+    20 series, Riot (half of them on Garena) and LPL.
+    '''
+    r = random.Random(seed)
+    recordings = Recordings(directory)
+    json_type = 'application/json'
+
+    def add_json(url, data, content_type=json_type):
+        recordings.add(url, 200, content_type, json.dumps(
+            data, ensure_ascii=False).encode('utf-8'))
+
+    add_json('https://ddragon.leagueoflegends.com/api/versions.json',
+             [PATCH, '10.0.1'])
+    add_json(
+        'https://ddragon.leagueoflegends.com/cdn/{0}/data/zh_TW/'
+        'champion.json'.format(PATCH),
+        {'data': dict((name, {'key': key, 'name': zh_name})
+                      for name, (key, zh_name) in CHAMPIONS.items())})
+    recordings.add(
+        'http://lpl.qq.com/web201612/data/LOL_MATCH2_TEAM_LIST.js', 200,
+        'application/javascript', _jsonp('LOL_MATCH2_TEAM_LIST', {
+            'status': '0',
+            'msg': dict((key, {'TeamId': key, 'TeamName': name})
+                        for key, name in LPL_TEAMS.items())}))
+
+    game_ids = iter(range(1002570000, 1002580000))
+    bmids = iter(range(5000, 6000))
+
+    def riot_series(games, garena=False):
+        urls = []
+        for _ in range(games):
+            game_id = next(game_ids)
+            minutes = r.randint(22, 45)
+            if garena:
+                acs = 'https://acs-garena.leagueoflegends.com'
+                query = ''
+                urls.append(
+                    'https://matchhistory.tw.leagueoflegends.com/zh/'
+                    '#match-details/TW/{0}/1234'.format(game_id))
+                server = 'TW'
+            else:
+                acs = 'https://acs.leagueoflegends.com'
+                game_hash = '{0:016x}'.format(r.getrandbits(64))
+                query = '?gameHash=' + game_hash
+                urls.append(
+                    'https://matchhistory.na.leagueoflegends.com/en/'
+                    '#match-details/TRLH1/{0}?gameHash={1}'.format(
+                        game_id, game_hash))
+                server = 'TRLH1'
+            base = '{0}/v1/stats/game/{1}/{2}'.format(acs, server, game_id)
+            add_json(base + query, synthetic_match(game_id, minutes))
+            recordings.add(base + '/timeline' + query, 200, json_type,
+                           synthetic_timeline(minutes, seed=game_id))
+        return urls
+
+    def lpl_series(games):
+        bmid = next(bmids)
+        match_ids = [bmid * 10 + i for i in range(games)]
+        recordings.add(
+            'http://apps.game.qq.com/lol/match/apis/searchSMatchList.php'
+            '?p0={0}&r1=SMatchListArr'.format(bmid), 200,
+            'application/javascript', _jsonp('SMatchListArr', {
+                'status': '0',
+                'msg': [{'sMatchId': str(match_id)}
+                        for match_id in match_ids]}))
+        for match_id in match_ids:
+            recordings.add(
+                'http://apps.game.qq.com/lol/match/apis/'
+                'searchMatchInfo_s.php?p0={0}&r1=MatchInfo'.format(match_id),
+                200, 'application/javascript',
+                _jsonp('MatchInfo', synthetic_lpl_match(match_id)))
+        return ['http://lpl.qq.com/es/stats.shtml?bmid={0}'.format(bmid)]
+
+    scenarios = {
+        'single': [riot_series(1)],
+        'bo5': [lpl_series(5)],
+        'batch': [riot_series(5, garena=i % 2 == 1) for i in range(10)] +
+                 [lpl_series(5) for _ in range(10)],
+    }
+    recordings.save()
+    with io.open(os.path.join(directory, 'scenarios.json'), 'w',
+                 encoding='utf-8') as f:
+        f.write(json.dumps(scenarios, indent=1))
+    return recordings
+
@@ -1,20 +1,88 @@
 from __future__ import absolute_import
 from __future__ import print_function
-import platform
+import os
+import io
+import codecs
+import collections
+import contextlib
 import re
+import shutil
+import sys
+import time
 import datetime
-import requests
+import functools
+import itertools
+import operator
+import hashlib
+import tempfile
+import threading
+import unicodedata
+import zlib
 import click
-import pyperclip
 from getpass import getpass
-from pyshorteners import Shortener
 import json
-from kitchen.text.display import textual_width_fill
 import six
 from six.moves import input, range
+from six.moves.urllib.parse import urlsplit
 
 VICTORY_MSG = u'\x1b[1;37;42m  \u52dd\u5229  \x1b[m'
 DEFEAT_MSG = u'\x1b[1;37;45m  \u6230\u6557  \x1b[m'
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or
+    os.path.join(os.path.expanduser('~'), '.cache'),
+    'ptt-lol-boxes')
+# How long a cached ddragon patch is trusted before asking again.
+DDRAGON_PATCH_TTL = 6 * 60 * 60
+# LPL teams rarely change within a split.
+LPL_TEAMS_TTL = 24 * 60 * 60
+SHORTENER_WORKERS = 4
+MATCH_MEMO_SIZE = 256
+DEFAULT_RESPONSE_CACHE_MB = 512
+RESPONSE_CHUNK_SIZE = 64 * 1024
+MONSTER_KILL_MARKER = u'"ELITE_MONSTER_KILL"'
+TIMELINE_SCAN_TAIL = 4096
+PARTICIPANT_IDS = tuple(str(i) for i in range(1, 11))
+NO_POSITION = {'x': 0, 'y': 0}
+TIMELINE_COLUMNS = ('timestamps', 'gold', 'xp', 'cs', 'positions', 'events')
+EVENT_DTYPE = [
+    ('timestamp', '<i8'), ('type', 'S24'), ('participant', '<i2'),
+    ('x', '<i4'), ('y', '<i4'), ('monster_type', 'S16'),
+    ('monster_sub_type', 'S16'),
+]
+# As many full-width cells as fit the 78 columns of a box with the labels.
+GRAPH_BUCKETS = 35
+# The objective marks of the graph, the later ones drawn over the others.
+GRAPH_OBJECTIVES = (
+    ('RIFTHERALD', u'\u9810'), ('DRAGON', u'\u9f8d'),
+    ('BARON_NASHOR', u'\u5df4'))
+# (connect, read) timeouts in seconds for every HTTP request.
+HTTP_TIMEOUT = (5, 30)
+DEFAULT_GAME_BUDGET = 60
+# A request slower than this percentile of the recent ones to the same
+# endpoint is sent once more. Until there are enough of them, requests
+# slower than HEDGE_DEFAULT_DELAY seconds are.
+HEDGE_PERCENTILE = 90
+HEDGE_SAMPLES = 50
+HEDGE_MIN_SAMPLES = 5
+HEDGE_DEFAULT_DELAY = 2.0
+HTTP_RETRIES = 3
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+HTTP_POOL_SIZE = 4
+# The match history and the timeline, each of them maybe hedged.
+REQUESTS_PER_GAME = 4
+# Hosts fetched for every game get a pool as large as the requests in
+# flight for the workers.
+HTTP_GAME_HOSTS = (
+    'https://acs.leagueoflegends.com',
+    'https://acs-garena.leagueoflegends.com',
+    'http://apps.game.qq.com',
+)
+
+
+EIGHTH_BLOCKS = ('', u'\u258F', u'\u258E', u'\u258D',
+                 u'\u258C', u'\u258B', u'\u258A', u'\u2589')
+# A full-width cell of the gold graph, from empty to full.
+GRAPH_GLYPHS = (u'  ',) + EIGHTH_BLOCKS[1:] + (u'\u2588',)
 
 
 def bar_chart(i):
@@ -29,26 +97,90 @@ def bar_chart(i):
     while i >= 8:
         result += u'\u2588'
         i -= 8
-    graphs = ['', u'\u258F', u'\u258E', u'\u258D',
-              u'\u258C', u'\u258B', u'\u258A', u'\u2589']
-    result += graphs[i]
+    result += EIGHTH_BLOCKS[i]
     return result + '  ' * (6 - len(result))
 
 
-def stats_first(stats, player):
+def _code_point_width(ucs):
+    '''
+    The textual width of a code point. These are the rules of kitchen's
+    textual_width (Markus Kuhn's wcwidth), with the combining characters
+    taken from unicodedata instead of a static table.
+    '''
+    if ucs < 32 or 0x7f <= ucs < 0xa0:
+        # Backspace, delete, clear delete and escape remove a character.
+        return -1 if ucs in (0x08, 0x7f, 0x94, 0x1b) else 0
+    char = six.unichr(ucs)
+    if (unicodedata.combining(char) or
+            (unicodedata.category(char) in ('Mn', 'Me', 'Cf') and
+             ucs != 0xad) or
+            0x1160 <= ucs <= 0x11ff or ucs == 0x200b):
+        return 0
+    return 1 + (ucs >= 0x1100 and (
+        ucs <= 0x115f or ucs == 0x2329 or ucs == 0x232a or
+        (0x2e80 <= ucs <= 0xa4cf and ucs != 0x303f) or
+        0xac00 <= ucs <= 0xd7a3 or
+        0xf900 <= ucs <= 0xfaff or
+        0xfe10 <= ucs <= 0xfe19 or
+        0xfe30 <= ucs <= 0xfe6f or
+        0xff00 <= ucs <= 0xff60 or
+        0xffe0 <= ucs <= 0xffe6 or
+        0x20000 <= ucs <= 0x2fffd or
+        0x30000 <= ucs <= 0x3fffd))
+
+
+# The width of every character seen so far, printable ASCII up front. The
+# other characters are added on first use: filling the 42k wide CJK, Hangul
+# and fullwidth code points up front takes about 20 ms at start-up.
+_CHAR_WIDTHS = dict((six.unichr(ucs), 1) for ucs in range(0x20, 0x7f))
+# Padded player and champion names, as they repeat a lot in a batch.
+_WIDTH_FILLS = {}
+WIDTH_FILL_CACHE_SIZE = 65536
+
+
+def textual_width(msg):
+    widths = _CHAR_WIDTHS
+    try:
+        return sum([widths[char] for char in msg])
+    except KeyError:
+        for char in msg:
+            if char not in widths:
+                widths[char] = _code_point_width(ord(char))
+        return sum([widths[char] for char in msg])
+
+
+def textual_width_fill(msg, fill):
+    '''
+    Pad msg with spaces until its textual width is fill, like kitchen's
+    textual_width_fill(msg, fill) but with the combining marks of current
+    Unicode (see benchmarks/check_width.py for the code points that
+    differ).
+    '''
+    key = (msg, fill)
+    try:
+        return _WIDTH_FILLS[key]
+    except KeyError:
+        pass
+    width = textual_width(msg)
+    filled = msg + u' ' * (fill - width) if width < fill else msg
+    if len(_WIDTH_FILLS) >= WIDTH_FILL_CACHE_SIZE:
+        _WIDTH_FILLS.clear()
+    _WIDTH_FILLS[key] = filled
+    return filled
+
+
+def stats_first(player):
     return u'{0} {1:>2}/{2:>2}/{3:>2} {4:>4} {5:>5}k'.format(
-        textual_width_fill(player, 16),
-        stats['kills'], stats['deaths'], stats['assists'],
-        stats['totalMinionsKilled'] + stats['neutralMinionsKilled'],
-        round(stats['goldEarned'] / 100.00) / 10)
+        textual_width_fill(player.name, 16),
+        player.kills, player.deaths, player.assists, player.cs,
+        round(player.gold / 100.00) / 10)
 
 
-def stats_second(participant, champions, max_damage):
-    damage = participant['stats']['totalDamageDealtToChampions']
+def stats_second(player, champions, max_damage):
     return u'{0} {1}  {2:>6}'.format(
-        textual_width_fill(champions[participant['championId']], 16),
-        bar_chart(round(damage * 48.00 / max_damage)),
-        damage
+        textual_width_fill(champions[player.champion_id], 16),
+        bar_chart(round(player.damage * 48.00 / max_damage)),
+        player.damage
     )
 
 
@@ -62,167 +194,1275 @@ def color_dragon(name):
     }[name]
 
 
-def get_champions():
+class Profiler(object):
+    '''
+    Collect the time spent in each stage and in every HTTP request, so a
+    slow run can be explained by --profile. Stages may run in many threads
+    at once, so their total time can be longer than the wall time.
+    '''
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = collections.OrderedDict()
+        self.requests = []
+        self.hooks = {'response': self.response_hook}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            with self._lock:
+                stage = self.stages.setdefault(name, [0, 0.0])
+                stage[0] += 1
+                stage[1] += elapsed
+
+    def response_hook(self, res, *args, **kwargs):
+        '''
+        A requests response hook. The latency is the time until the headers
+        arrive. The size is that of the decompressed body, counted as it is
+        read, as the hook runs before the body is read, streamed or not.
+        '''
+        request = {
+            'host': urlsplit(res.url).netloc,
+            'url': res.url,
+            'status': res.status_code,
+            'bytes': 0,
+            'seconds': res.elapsed.total_seconds(),
+        }
+        iter_content = res.iter_content
+
+        # res.content reads the body through iter_content as well.
+        def counted_iter_content(*args, **kwargs):
+            for chunk in iter_content(*args, **kwargs):
+                request['bytes'] += len(chunk)
+                yield chunk
+        res.iter_content = counted_iter_content
+        with self._lock:
+            self.requests.append(request)
+
+    def as_dict(self):
+        return {
+            'wall_seconds': time.time() - self.started,
+            'stages': [
+                {'stage': name, 'calls': calls, 'seconds': seconds}
+                for name, (calls, seconds) in six.iteritems(self.stages)
+            ],
+            'requests': self.requests,
+        }
+
+    def report(self):
+        lines = ['* Profile: {0:.3f}s wall time'.format(
+            time.time() - self.started)]
+        lines.append('{0:<24}{1:>6}{2:>10}{3:>10}'.format(
+            'Stage', 'Calls', 'Total', 'Avg'))
+        for name, (calls, seconds) in six.iteritems(self.stages):
+            lines.append('{0:<24}{1:>6}{2:>9.3f}s{3:>9.3f}s'.format(
+                name, calls, seconds, seconds / calls))
+        hosts = collections.OrderedDict()
+        for request in self.requests:
+            host = hosts.setdefault(request['host'], [0, 0, 0.0, 0.0, set()])
+            host[0] += 1
+            host[1] += request['bytes']
+            host[2] += request['seconds']
+            host[3] = max(host[3], request['seconds'])
+            host[4].add(request['status'])
+        lines.append('{0:<32}{1:>6}{2:>10}{3:>10}{4:>10}  {5}'.format(
+            'Host', 'Reqs', 'KB', 'Total', 'Max', 'Status'))
+        for name, (count, size, seconds, slowest, statuses) in \
+                six.iteritems(hosts):
+            lines.append(
+                '{0:<32}{1:>6}{2:>10.1f}{3:>9.3f}s{4:>9.3f}s  {5}'.format(
+                    name, count, size / 1024.0, seconds, slowest,
+                    ','.join(str(status) for status in sorted(statuses))))
+        return '\n'.join(lines)
+
+
+PROFILER = Profiler()
+
+
+def _with_default_timeout(request):
+    @functools.wraps(request)
+    def wrapper(*args, **kwargs):
+        kwargs.setdefault('timeout', HTTP_TIMEOUT)
+        return request(*args, **kwargs)
+    return wrapper
+
+
+def create_http_session(workers, profile=False):
+    '''
+    Create the pooled session shared by every fetcher. Connections are kept
+    alive per host, 429 / 5xx responses are retried with backoff, and every
+    request has a default timeout so a hung one cannot stall the whole run.
+    With profile, every request is recorded by PROFILER.
+    '''
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    session.request = _with_default_timeout(session.request)
+    retry = Retry(total=HTTP_RETRIES, backoff_factor=0.5,
+                  status_forcelist=HTTP_RETRY_STATUSES)
+    adapter = HTTPAdapter(pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    game_adapter = HTTPAdapter(
+        pool_maxsize=max(HTTP_POOL_SIZE, workers * REQUESTS_PER_GAME),
+        max_retries=retry)
+    for prefix in HTTP_GAME_HOSTS:
+        session.mount(prefix, game_adapter)
+    # Only when asked, as a --serve process would keep them all.
+    if profile:
+        session.hooks['response'].append(PROFILER.response_hook)
+    return session
+
+
+def read_json_file(path):
+    '''
+    Read a JSON file from the cache, None if it is missing or broken.
+    '''
+    try:
+        with io.open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def ensure_directory(directory):
+    '''
+    Create a directory, which another thread may be creating as well.
+    '''
+    try:
+        os.makedirs(directory)
+    except OSError:
+        if not os.path.isdir(directory):
+            raise
+
+
+def write_json_file(path, data):
+    '''
+    Atomically write a JSON file into the cache.
+    '''
+    directory = os.path.dirname(path)
+    ensure_directory(directory)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with io.open(fd, 'w', encoding='utf-8') as f:
+        f.write(six.text_type(json.dumps(data, ensure_ascii=False)))
+    os.replace(tmp_path, path)
+
+
+class TTLCache(object):
+    '''
+    A thread-safe memo shared by the whole run. Entries expire after ttl
+    seconds (never if ttl is None), and are persisted as JSON to path if
+    it is given. Each key is loaded only once even when many threads ask
+    for it at the same time.
+    '''
+
+    def __init__(self, ttl=None, path=''):
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._entries = (read_json_file(path) or {}) if path else {}
+
+    def peek(self, key):
+        '''
+        Return the value of key if it is cached and fresh, else None.
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (
+                    self.ttl is None or time.time() - entry[0] < self.ttl):
+                return entry[1]
+        return None
+
+    def get(self, key, loader):
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self._entries.get(key)
+            if entry is not None and (
+                    self.ttl is None or time.time() - entry[0] < self.ttl):
+                with self._lock:
+                    self.hits += 1
+                return entry[1]
+            value = loader()
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = [time.time(), value]
+                if self.path:
+                    write_json_file(self.path, self._entries)
+            return value
+
+
+class ResponseCache(object):
+    '''
+    A zlib-compressed on-disk cache for match payloads, which never change
+    once a game is finished. Files are named by the SHA-1 of their key, and
+    the least recently used ones are evicted once the total size exceeds
+    max_bytes. An empty directory disables the cache.
+    '''
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # The total size, counted by the first write and then kept up to
+        # date, so the directory is only scanned again once it is full.
+        self._size = None
+
+    def _path(self, key):
+        return os.path.join(
+            self.directory,
+            hashlib.sha1(key.encode('utf-8')).hexdigest() + '.z')
+
+    def has(self, key):
+        return bool(self.directory) and os.path.exists(self._path(key))
+
+    def iter_chunks(self, key, chunk_size=RESPONSE_CHUNK_SIZE):
+        '''
+        Return an iterator of the decompressed body chunks, or None if the
+        key is not cached.
+        '''
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            f = open(path, 'rb')
+            # The modified time is used as the last access time for LRU.
+            os.utime(path, None)
+        except (IOError, OSError):
+            return None
+        return self._read_chunks(f, chunk_size)
+
+    def _read_chunks(self, f, chunk_size):
+        decompressor = zlib.decompressobj()
+        with f:
+            for compressed in iter(lambda: f.read(chunk_size), b''):
+                yield decompressor.decompress(compressed)
+        yield decompressor.flush()
+
+    def writer(self, key):
+        return _ResponseCacheWriter(self, key)
+
+    def added(self, size):
+        '''
+        Count a file of size bytes just written into the cache, and evict
+        the least recently used files if the cache is full.
+        '''
+        with self._lock:
+            if self._size is not None and \
+                    self._size + size <= self.max_bytes:
+                self._size += size
+                return
+            self._size = self._evict()
+
+    def _evict(self):
+        '''
+        Scan the cache, evict files until it fits max_bytes, and return
+        its size.
+        '''
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.z'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+        return total
+
+
+class _ResponseCacheWriter(object):
+    '''
+    Compress a body into the cache chunk by chunk. Nothing is stored unless
+    close() is called after the last chunk; abort() drops what was written.
+    '''
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self._file = None
+        if cache.directory:
+            ensure_directory(cache.directory)
+            fd, self._tmp_path = tempfile.mkstemp(
+                dir=cache.directory, suffix='.tmp')
+            self._file = io.open(fd, 'wb')
+            self._compressor = zlib.compressobj()
+
+    def write(self, chunk):
+        if self._file:
+            self._file.write(self._compressor.compress(chunk))
+
+    def close(self):
+        if self._file:
+            self._file.write(self._compressor.flush())
+            size = self._file.tell()
+            self._file.close()
+            os.replace(self._tmp_path, self.cache._path(self.key))
+            self.cache.added(size)
+
+    def abort(self):
+        if self._file:
+            self._file.close()
+            try:
+                os.remove(self._tmp_path)
+            except OSError:
+                pass
+
+
+class HedgedRequests(object):
+    '''
+    GET the slow acs documents on their own threads, streamed. When the
+    headers of a response take longer than HEDGE_PERCENTILE of the recent
+    requests to the same endpoint, it is sent once more, and whichever
+    response comes first is used, its body still to be read; the other one
+    is closed. Every wait is bounded by the deadline of the game, budget
+    seconds after it started.
+    '''
+
+    def __init__(self, session, budget):
+        self.session = session
+        self.budget = budget
+        self.hedged = 0
+        self.hedges_won = 0
+        self._latencies = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def deadline(self):
+        return time.time() + self.budget
+
+    def check_deadline(self, url, deadline):
+        '''
+        Raise a ClickException once the deadline has passed.
+        '''
+        if time.time() >= deadline:
+            raise click.ClickException(
+                'Gave up on {0} after the {1}s budget of the game.'.format(
+                    url, self.budget))
+
+    @staticmethod
+    def endpoint(url):
+        '''
+        The host and path of url without the ids, like
+        acs.leagueoflegends.com/v/stats/game/TRLH/timeline.
+        '''
+        parts = urlsplit(url)
+        return parts.netloc + re.sub(r'[0-9]+', '', parts.path)
+
+    def threshold(self, endpoint):
+        '''
+        How long to wait for a request to endpoint before hedging it.
+        '''
+        with self._lock:
+            latencies = sorted(self._latencies.get(endpoint, ()))
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return latencies[
+            min(len(latencies) - 1, len(latencies) * HEDGE_PERCENTILE // 100)]
+
+    def _send(self, url, deadline):
+        start = time.time()
+        res = self.session.get(url, stream=True, timeout=(
+            HTTP_TIMEOUT[0],
+            max(min(HTTP_TIMEOUT[1], deadline - start), HTTP_TIMEOUT[0])))
+        if res.ok:
+            with self._lock:
+                self._latencies.setdefault(
+                    self.endpoint(url),
+                    collections.deque(maxlen=HEDGE_SAMPLES),
+                ).append(time.time() - start)
+        return res
+
+    def _submit(self, url, deadline):
+        '''
+        Send a request on a daemon thread, so the losing one of a hedged
+        pair does not keep the process alive. Returns its future.
+        '''
+        from concurrent.futures import Future
+        future = Future()
+
+        def send():
+            try:
+                future.set_result(self._send(url, deadline))
+            except Exception as e:
+                future.set_exception(e)
+        thread = threading.Thread(target=send)
+        thread.daemon = True
+        thread.start()
+        return future
+
+    @staticmethod
+    def _close(future):
+        '''
+        Close the response of a request not used, once it arrives, so its
+        connection goes back to the pool.
+        '''
+        def close(future):
+            if future.exception() is None:
+                future.result().close()
+        future.add_done_callback(close)
+
+    def prefetch(self, url, deadline, generation=0):
+        '''
+        Start getting url, for a later get. generation is the one of the
+        Riot sign-in it is sent with.
+        '''
+        future = self._submit(url, deadline)
+        with self._lock:
+            if self._in_flight.setdefault(
+                    url, (time.time(), future, generation))[1] is future:
+                return
+        self._close(future)
+
+    def discard(self, url):
+        with self._lock:
+            _, future, _ = self._in_flight.pop(url, (None, None, None))
+        if future:
+            self._close(future)
+
+    def get(self, url, deadline, generation=0):
+        '''
+        Return the streamed response of url, prefetched or not, hedging it
+        once when it is slow, and the generation of the Riot sign-in it was
+        sent with: the one given to prefetch, or else generation. Raise a
+        ClickException once the deadline has passed.
+        '''
+        from concurrent.futures import FIRST_COMPLETED, wait
+        with self._lock:
+            start, primary, generation = self._in_flight.pop(
+                url, (None, None, generation))
+        if primary is None:
+            start, primary = time.time(), self._submit(url, deadline)
+        hedge_at = start + self.threshold(self.endpoint(url))
+        hedge = None
+        pending = [primary]
+        error = None
+        while pending:
+            now = time.time()
+            try:
+                self.check_deadline(url, deadline)
+            except click.ClickException:
+                for future in pending:
+                    self._close(future)
+                raise
+            done, _ = wait(
+                pending,
+                timeout=(deadline if hedge else min(hedge_at, deadline)) -
+                now,
+                return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                error = future.exception()
+                if error is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.hedges_won += 1
+                    for other in pending:
+                        self._close(other)
+                    return future.result(), generation
+            if pending and hedge is None and time.time() >= hedge_at:
+                print('* Slow response, sending {0} again...'.format(url))
+                hedge = self._submit(url, deadline)
+                pending.append(hedge)
+                with self._lock:
+                    self.hedged += 1
+        raise error
+
+
+def iter_cached_response(session, url, key, response_cache, offline,
+                         riot_auth=None, hedger=None, deadline=None):
+    '''
+    Yield the body of url chunk by chunk, from the response cache if it is
+    there, or from the network while storing it into the cache. With
+    riot_auth, a rejected session is signed in again and retried once.
+    With hedger, the request is hedged through it, and the body must be
+    read by deadline.
+    '''
+    chunks = response_cache.iter_chunks(key)
+    if chunks is not None:
+        for chunk in chunks:
+            yield chunk
+        return
+    if offline:
+        raise click.ClickException(
+            '{0} is not cached, cannot render it offline.'.format(url))
+
+    def get():
+        # Taken when the request is sent, or was prefetched.
+        generation = riot_auth.generation if riot_auth else 0
+        if hedger:
+            return hedger.get(url, deadline, generation)
+        return session.get(url, stream=True), generation
+    res, generation = get()
+    if riot_auth and res.status_code in (401, 403):
+        res.close()
+        riot_auth.refresh(generation)
+        res, _ = get()
+    res.raise_for_status()
+    writer = response_cache.writer(key)
+    try:
+        for chunk in res.iter_content(RESPONSE_CHUNK_SIZE):
+            if hedger:
+                hedger.check_deadline(url, deadline)
+            writer.write(chunk)
+            yield chunk
+    except BaseException:
+        # Also when the download fails or the body is not read to the end.
+        res.close()
+        writer.abort()
+        raise
+    writer.close()
+
+
+def fetch_cached_json(session, url, key, response_cache, offline,
+                      riot_auth=None, hedger=None, deadline=None):
+    '''
+    Get a JSON document from the response cache, or fetch and cache it.
+    '''
+    body = b''.join(iter_cached_response(
+        session, url, key, response_cache, offline, riot_auth, hedger,
+        deadline))
+    return json.loads(body.decode('utf-8'))
+
+
+def _event_start(text, position):
+    '''
+    Find the opening brace of the JSON object enclosing position.
+    '''
+    depth = 0
+    for i in range(position - 1, -1, -1):
+        c = text[i]
+        if c == '}':
+            depth += 1
+        elif c == '{':
+            if depth == 0:
+                return i
+            depth -= 1
+    return -1
+
+
+def iter_monster_kills(chunks):
+    '''
+    Pull the ELITE_MONSTER_KILL events out of a timeline document, given as
+    byte chunks, as the chunks arrive. Instead of building all the frames,
+    only the few monster-kill event objects are decoded, and only a small
+    tail of the document is kept between chunks.
+    '''
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    json_decoder = json.JSONDecoder()
+    text = u''
+    for chunk in itertools.chain(chunks, [None]):
+        if chunk is None:
+            text += decoder.decode(b'', final=True)
+        else:
+            text += decoder.decode(chunk)
+        position = 0
+        # Keep enough of the tail for a marker split between two chunks,
+        # together with the beginning of its event object.
+        cut = len(text) - TIMELINE_SCAN_TAIL
+        while True:
+            marker = text.find(MONSTER_KILL_MARKER, position)
+            if marker < 0:
+                break
+            start = _event_start(text, marker)
+            if start < 0:
+                position = marker + len(MONSTER_KILL_MARKER)
+                continue
+            try:
+                event, position = json_decoder.raw_decode(text, start)
+            except ValueError:
+                # The event is not complete yet, wait for the next chunk.
+                cut = min(cut, start)
+                position = start
+                break
+            yield event
+        text = text[max(cut, position, 0):]
+
+
+def get_dragon_kills(chunks):
+    '''
+    Return (killerId, monsterSubType) of every dragon slain in a timeline.
+    '''
+    return [
+        (event['killerId'], event['monsterSubType'])
+        for event in iter_monster_kills(chunks)
+        if event.get('monsterType', '') == 'DRAGON'
+    ]
+
+
+class Timeline(object):
+    '''
+    The frames of a Riot game as NumPy arrays, one row per frame:
+    timestamps in milliseconds, then gold, xp and cs with a column per
+    participant, and positions with an (x, y) per participant. events is a
+    structured array of EVENT_DTYPE, where participant is the killer, or
+    the participant of the other events.
+    '''
+    __slots__ = TIMELINE_COLUMNS
+
+    def __init__(self, timestamps, gold, xp, cs, positions, events):
+        self.timestamps = timestamps
+        self.gold = gold
+        self.xp = xp
+        self.cs = cs
+        self.positions = positions
+        self.events = events
+
+    def monster_kills(self, monster_type):
+        '''
+        The events of the monsters of monster_type slain.
+        '''
+        events = self.events
+        return events[(events['type'] == b'ELITE_MONSTER_KILL') &
+                      (events['monster_type'] == monster_type.encode())]
+
+    @property
+    def dragon_kills(self):
+        dragons = self.monster_kills('DRAGON')
+        return [
+            (killer_id, monster_sub_type.decode())
+            for killer_id, monster_sub_type in zip(
+                dragons['participant'].tolist(),
+                dragons['monster_sub_type'].tolist())
+        ]
+
+
+def parse_timeline(timeline):
+    '''
+    Build a Timeline out of a timeline document, reading each column of the
+    participant frames of the whole game into one array at once.
+    '''
+    import numpy as np
+
+    frames = timeline['frames']
+    get_participants = operator.itemgetter(*PARTICIPANT_IDS)
+    participants = [
+        participant
+        for frame in frames
+        for participant in get_participants(frame['participantFrames'])
+    ]
+    shape = (len(frames), len(PARTICIPANT_IDS))
+
+    def column(values):
+        return np.fromiter(
+            values, dtype='<i4', count=len(participants)).reshape(shape)
+
+    positions = [participant.get('position', NO_POSITION)
+                 for participant in participants]
+    events = [event for frame in frames for event in frame['events']]
+    return Timeline(
+        np.fromiter((frame['timestamp'] for frame in frames), dtype='<i8',
+                    count=len(frames)),
+        column(participant['totalGold'] for participant in participants),
+        column(participant['xp'] for participant in participants),
+        column(participant['minionsKilled'] +
+               participant['jungleMinionsKilled']
+               for participant in participants),
+        np.stack([
+            column(position['x'] for position in positions),
+            column(position['y'] for position in positions),
+        ], axis=-1),
+        np.array([
+            (event['timestamp'], event['type'],
+             event.get('killerId', event.get('participantId', 0)),
+             event.get('position', NO_POSITION)['x'],
+             event.get('position', NO_POSITION)['y'],
+             event.get('monsterType', ''), event.get('monsterSubType', ''))
+            for event in events
+        ], dtype=EVENT_DTYPE))
+
+
+def get_ddragon_patch(session, cache_dir, offline):
+    '''
+    Get the latest ddragon patch. A cached patch is reused as it is within
+    DDRAGON_PATCH_TTL (or forever in offline mode), and revalidated with
+    ETag / Last-Modified after that.
+    '''
+    meta_path = os.path.join(cache_dir, 'ddragon.json') if cache_dir else ''
+    meta = read_json_file(meta_path) if meta_path else None
+    if meta and (offline or
+                 time.time() - meta['checked'] < DDRAGON_PATCH_TTL):
+        return meta['patch']
+    if offline:
+        raise click.ClickException(
+            'No cached champion data, please run without --offline first.')
+
+    headers = {}
+    if meta and meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta and meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    res = session.get('https://ddragon.leagueoflegends.com'
+                      '/api/versions.json', headers=headers)
+    etag = res.headers.get('ETag', '')
+    last_modified = res.headers.get('Last-Modified', '')
+    if res.status_code == 304:
+        ddragon_patch = meta['patch']
+        # A 304 may leave out the validators, which are still the same.
+        etag = etag or meta.get('etag', '')
+        last_modified = last_modified or meta.get('last_modified', '')
+    else:
+        res.raise_for_status()
+        ddragon_patch = res.json()[0]
+    if meta_path:
+        write_json_file(meta_path, {
+            'patch': ddragon_patch,
+            'etag': etag,
+            'last_modified': last_modified,
+            'checked': time.time(),
+        })
+    return ddragon_patch
+
+
+def get_champions(session, cache_dir='', offline=False):
     # Get the latest ddragon version and get champion data.
     print('* Getting champion data...')
-    res = requests.get('https://ddragon.leagueoflegends.com'
-                       '/api/versions.json')
-    ddragon_patch = res.json()[0]
-    champion_url = ('https://ddragon.leagueoflegends.com/cdn/'
-                    '{0}/data/zh_TW/champion.json').format(
-                        ddragon_patch)
-    res = requests.get(champion_url)
-    champions_dict = res.json()['data']
+    ddragon_patch = get_ddragon_patch(session, cache_dir, offline)
+    # Champion data never changes within a patch, so cache it by patch.
+    champions_path = (
+        os.path.join(cache_dir, 'champions-{0}.json'.format(ddragon_patch))
+        if cache_dir else '')
+    cached = read_json_file(champions_path) if champions_path else None
+    if cached is None:
+        if offline:
+            raise click.ClickException(
+                'No cached champion data for patch {0}.'.format(
+                    ddragon_patch))
+        champion_url = ('https://ddragon.leagueoflegends.com/cdn/'
+                        '{0}/data/zh_TW/champion.json').format(
+                            ddragon_patch)
+        res = session.get(champion_url)
+        res.raise_for_status()
+        champions_dict = res.json()['data']
+        cached = dict([
+            (detail['key'], detail['name'])
+            for _, detail in six.iteritems(champions_dict)
+        ])
+        if champions_path:
+            write_json_file(champions_path, cached)
     champions = dict([
-        (int(detail['key']), detail['name'])
-        for _, detail in six.iteritems(champions_dict)
+        (int(key), name) for key, name in six.iteritems(cached)
     ])
     # Deal with empty bans in ranked games.
     champions[-1] = u'(\u7121)'
     return champions
 
 
-def output_match_result(data, game_number, short_url, champions, lpl=False):
-    print('* Preparing output...')
+class Player(object):
+    '''
+    The stats of a player in a game. cs includes the neutral minions.
+    '''
+    __slots__ = ('name', 'champion_id', 'kills', 'deaths', 'assists', 'cs',
+                 'gold', 'damage')
+
+    def __init__(self, name, champion_id, kills, deaths, assists, cs, gold,
+                 damage):
+        self.name = name
+        self.champion_id = champion_id
+        self.kills = kills
+        self.deaths = deaths
+        self.assists = assists
+        self.cs = cs
+        self.gold = gold
+        self.damage = damage
 
-    output = ''
 
-    # Output the result line-by-line.
-    output += (u'\x1b[1;37;46mGame {0:>2}\x1b[m ' +
-               (u'\u2500' * 15) + u'\u252c' + (u'\u2500' * 13) +
-               ' {1}\n').format(game_number, data['game_date'])
-
-    blue_team_spaces = 12 - len(data['blue_team_name']) // 2
-    red_team_spaces = 12 - len(data['red_team_name']) // 2
-
-    output += (u'{0}\x1b[1;37;44m{1}\x1b[m{2}{3:>6}    '
-               u'\x1b[1;36;40m{4:>2}\x1b[m'
-               u'  \u2502  \x1b[1;31;40m{5:>2}\x1b[m    '
-               u'{6:<6}{7}\x1b[1;37;41m{8}\x1b[m\n').format(
-        ' ' * blue_team_spaces, data['blue_team_name'],
-        ' ' * (24 - blue_team_spaces - len(data['blue_team_name'])),
-        data['blue_golds'], data['blue_kills'],
-        data['red_kills'], data['red_golds'],
-        ' ' * red_team_spaces, data['red_team_name'])
-    if lpl:
-        output += u'{0}{1}{2}{3}  \u2502  {4}{5}{6}\n'.format(
-            ' ' * 8, data['blue_result'], ' ' * 9, ' ' * 11,
-            data['duration'], ' ' * 15, data['red_result'])
+class Team(object):
+    '''
+    A side of a game. bans are five champion ids, 0 for no ban. dragons are
+    the dragon sub types slain, or the raw s-dragon text for LPL games.
+    '''
+    __slots__ = ('name', 'win', 'bans', 'dragons', 'towers', 'inhibitors',
+                 'heralds', 'barons')
+
+    def __init__(self, name, win, bans, dragons, towers, inhibitors, heralds,
+                 barons):
+        self.name = name
+        self.win = win
+        self.bans = tuple(bans) + (0,) * (5 - len(bans))
+        self.dragons = dragons
+        self.towers = towers
+        self.inhibitors = inhibitors
+        self.heralds = heralds
+        self.barons = barons
+
+
+class Match(object):
+    '''
+    A game filled in by the Riot or the LPL adapter. players are the ten
+    players, the blue side first. duration is in seconds, and patch is
+    empty for LPL games. timeline is only parsed for the gold graph, and
+    short_url is empty without bitly.
+    '''
+    __slots__ = ('date', 'duration', 'patch', 'lpl', 'blue', 'red', 'players',
+                 'timeline', 'short_url')
+
+    def __init__(self, date, duration, patch, lpl, blue, red, players,
+                 timeline=None, short_url=''):
+        self.date = date
+        self.duration = duration
+        self.patch = patch
+        self.lpl = lpl
+        self.blue = blue
+        self.red = red
+        self.players = players
+        self.timeline = timeline
+        self.short_url = short_url
+
+
+def archive_game(directory, name, match, timeline):
+    '''
+    Store a game in the archive under directory/name: a .npy file for each
+    column of its timeline, and meta.json for the rest of the match.
+    Finished games never change, so a game already archived is kept.
+    '''
+    import numpy as np
+
+    path = os.path.join(directory, name)
+    if os.path.isdir(path):
+        return path
+    ensure_directory(directory)
+    # Write into a temporary directory, so a game is either archived as a
+    # whole or not at all.
+    tmp_path = tempfile.mkdtemp(dir=directory, suffix='.tmp')
+    for column in TIMELINE_COLUMNS:
+        np.save(os.path.join(tmp_path, column + '.npy'),
+                getattr(timeline, column))
+    write_json_file(os.path.join(tmp_path, 'meta.json'), {
+        'date': match.date,
+        'duration': match.duration,
+        'patch': match.patch,
+        'teams': [
+            dict((slot, getattr(team, slot)) for slot in Team.__slots__)
+            for team in (match.blue, match.red)],
+        'players': [
+            dict((slot, getattr(player, slot)) for slot in Player.__slots__)
+            for player in match.players],
+    })
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Archived by another job meanwhile.
+        shutil.rmtree(tmp_path)
+    return path
+
+
+class Archive(object):
+    '''
+    A directory of archived games, read back as memory-mapped arrays:
+    nothing is read from disk until sliced, and slices are views of the
+    files instead of copies.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        # Games still being written by archive_game end with .tmp.
+        self.games = sorted(
+            name for name in os.listdir(directory)
+            if not name.endswith('.tmp') and
+            os.path.isfile(os.path.join(directory, name, 'meta.json')))
+        self._columns = {}
+
+    def meta(self, game):
+        return read_json_file(
+            os.path.join(self.directory, game, 'meta.json'))
+
+    def column(self, game, column):
+        '''
+        A column of TIMELINE_COLUMNS of a game, memory-mapped.
+        '''
+        import numpy as np
+
+        key = (game, column)
+        if key not in self._columns:
+            self._columns[key] = np.load(
+                os.path.join(self.directory, game, column + '.npy'),
+                mmap_mode='r')
+        return self._columns[key]
+
+    def timeline(self, game):
+        return Timeline(*(
+            self.column(game, column) for column in TIMELINE_COLUMNS))
+
+    def select(self, column, index=Ellipsis):
+        '''
+        Slice a column the same way in every game, e.g.
+        select('gold', 15) for the gold of every player at 15 minutes.
+        Returns a view per game; games too short for index are left out.
+        '''
+        views = []
+        for game in self.games:
+            try:
+                views.append(self.column(game, column)[index])
+            except IndexError:
+                continue
+        return views
+
+
+def format_golds(players):
+    return '{}k'.format(
+        round(sum(player.gold for player in players) / 100.00) / 10)
+
+
+# The line templates of a box, in the order they are output.
+BOX_HEADER = (u'\x1b[1;37;46mGame {0:>2}\x1b[m ' +
+              (u'\u2500' * 15) + u'\u252c' + (u'\u2500' * 13) + ' {1}\n')
+BOX_TEAMS = (u'{0}\x1b[1;37;44m{1}\x1b[m{2}{3:>6}    '
+             u'\x1b[1;36;40m{4:>2}\x1b[m'
+             u'  \u2502  \x1b[1;31;40m{5:>2}\x1b[m    '
+             u'{6:<6}{7}\x1b[1;37;41m{8}\x1b[m\n')
+BOX_RESULTS = (u' ' * 8 + u'{0}' + u' ' * 9 + u'PATCH{1:>6}  \u2502  {2}' +
+               u' ' * 15 + u'{3}\n')
+BOX_RESULTS_LPL = (u' ' * 8 + u'{0}' + u' ' * 20 + u'  \u2502  {1}' +
+                   u' ' * 15 + u'{2}\n')
+BOX_SEPARATOR = (u'\u2500' * 19) + u'\u253c' + (u'\u2500' * 19) + '\n'
+BOX_STATS_HEADER = u'{0} \u2502 {0}\n'.format(
+    ' ' * 18 + '\x1b[1;37;40mK  D  A   CS  $/Dmg\x1b[m')
+BOX_PLAYERS = (u'\x1b[1;36;40m{0}\x1b[m \u2502 '
+               u'\x1b[1;31;40m{1}\x1b[m\n')
+BOX_CHAMPIONS = u'{0} \u2502 {1}\n'
+BOX_BANS = u'\u7981\u7528 {0} {1} {2} \u2502 \u7981\u7528 {3} {4} {5}\n'
+BOX_BANS_SECOND = (u' ' * 4 + u' {0} {1} ' + u' ' * 10 + u' \u2502 ' +
+                   u' ' * 4 + u' {2} {3}\n')
+BOX_DRAGONS = u'\u5c0f\u9f8d {0} \u2502 \u5c0f\u9f8d {1}\n'
+BOX_OBJECTIVES = (u'{0:>2} \u5854 / {1} \u5175\u71df / '
+                  u'{2} \u9810\u793a\u8005 / {3:>2} \u5df4\u9f8d  '
+                  u' \u2502 '
+                  u'{4:>2} \u5854 / {5} \u5175\u71df / '
+                  u'{6} \u9810\u793a\u8005 / {7:>2} \u5df4\u9f8d\n')
+BOX_OBJECTIVES_LPL = (u'{0:>2} \u5854 / {1:>2} \u5df4\u9f8d' + u' ' * 22 +
+                      u' \u2502 '
+                      u'{2:>2} \u5854 / {3:>2} \u5df4\u9f8d\n')
+BOX_GRAPH_SEPARATOR = (u'\u2500' * 19) + u'\u2534' + (u'\u2500' * 19) + '\n'
+BOX_GRAPH_BLUE = u'\x1b[1;36;40m{0}\x1b[m {1:>6.1f}k\n'
+BOX_GRAPH_RED = u'\x1b[1;31;40m{0}\x1b[m {1:>6.1f}k\n'
+BOX_GRAPH_OBJECTIVES = u'{0} {1:>7}\n'
+BOX_FOOTER = (u'\u2500' * 19) + u'\u2534' + (u'\u2500' * 19) + '\n\n'
+BOX_FOOTER_URL = (u'\u2500' * 19) + u'\u2534' + (u'\u2500' * 6) + '{0:>26}\n\n'
+BOX_GRAPH_FOOTER = (u'\u2500' * 39) + '\n\n'
+BOX_GRAPH_FOOTER_URL = (u'\u2500' * 26) + '{0:>26}\n\n'
+
+
+def gold_graph(timeline, duration):
+    '''
+    Output the lines of the gold graph: the gold lead of each side over
+    GRAPH_BUCKETS equal slices of the game, then where the objectives were
+    slain.
+    '''
+    import numpy as np
+
+    if not len(timeline.timestamps):
+        return []
+    gold = timeline.gold
+    difference = gold[:, :5].sum(axis=1) - gold[:, 5:].sum(axis=1)
+    edges = np.linspace(0, duration * 1000, GRAPH_BUCKETS + 1)
+    buckets = np.interp(
+        (edges[:-1] + edges[1:]) / 2, timeline.timestamps, difference)
+    levels = np.ceil(
+        np.abs(buckets) * 8 / (np.abs(buckets).max() or 1)).astype(int)
+    blue = np.where(buckets > 0, levels, 0).tolist()
+    red = np.where(buckets < 0, levels, 0).tolist()
+
+    objectives = [u'  '] * GRAPH_BUCKETS
+    for monster_type, mark in GRAPH_OBJECTIVES:
+        kills = timeline.monster_kills(monster_type)
+        slices = np.clip(
+            np.searchsorted(edges, kills['timestamp'], side='right') - 1,
+            0, GRAPH_BUCKETS - 1).tolist()
+        for i, killer_id in zip(slices, kills['participant'].tolist()):
+            objectives[i] = u'\x1b[1;{0};40m{1}\x1b[m'.format(
+                36 if killer_id <= 5 else 31, mark)
+    m, s = divmod(duration, 60)
+    return [
+        BOX_GRAPH_BLUE.format(
+            u''.join(GRAPH_GLYPHS[level] for level in blue),
+            max(difference.max(), 0) / 1000.0),
+        BOX_GRAPH_RED.format(
+            u''.join(GRAPH_GLYPHS[level] for level in red),
+            max(-difference.min(), 0) / 1000.0),
+        BOX_GRAPH_OBJECTIVES.format(
+            u''.join(objectives), '{0:02d}:{1:02d}'.format(m, s)),
+    ]
+
+
+def output_match_result(match, game_number, short_url, champions):
+    print('* Preparing output...')
+
+    blue, red = match.blue, match.red
+    blue_players, red_players = match.players[:5], match.players[5:]
+    m, s = divmod(match.duration, 60)
+    duration = '{0:02d}:{1:02d}'.format(m, s)
+    blue_result = VICTORY_MSG if blue.win else DEFEAT_MSG
+    red_result = VICTORY_MSG if red.win else DEFEAT_MSG
+    blue_bans = [
+        textual_width_fill(champions[ban] if ban else '', 10)
+        for ban in blue.bans]
+    red_bans = [
+        textual_width_fill(champions[ban] if ban else '', 10)
+        for ban in red.bans]
+    if match.lpl:
+        blue_dragons = '{0:<32}'.format(blue.dragons)
+        red_dragons = red.dragons
     else:
-        output += u'{0}{1}{2}PATCH{3:>6}  \u2502  {4}{5}{6}\n'.format(
-            ' ' * 8, data['blue_result'], ' ' * 9, data['patch_ver'],
-            data['duration'], ' ' * 15, data['red_result'])
-    output += (u'\u2500' * 19) + u'\u253c' + (u'\u2500' * 19) + '\n'
-    output += u'{0} \u2502 {0}\n'.format(
-        ' ' * 18 + '\x1b[1;37;40mK  D  A   CS  $/Dmg\x1b[m')
+        blue_dragons = u''.join(
+            color_dragon(dragon) for dragon in blue.dragons)
+        blue_dragons += ' ' * (32 - len(blue.dragons) * 2)
+        red_dragons = u''.join(color_dragon(dragon) for dragon in red.dragons)
+    max_damage = max(player.damage for player in match.players)
+    blue_team_spaces = 12 - len(blue.name) // 2
+    red_team_spaces = 12 - len(red.name) // 2
 
+    # Output the result line-by-line, and join them at once.
+    lines = [
+        BOX_HEADER.format(game_number, match.date),
+        BOX_TEAMS.format(
+            ' ' * blue_team_spaces, blue.name,
+            ' ' * (24 - blue_team_spaces - len(blue.name)),
+            format_golds(blue_players),
+            sum(player.kills for player in blue_players),
+            sum(player.kills for player in red_players),
+            format_golds(red_players),
+            ' ' * red_team_spaces, red.name),
+        BOX_RESULTS_LPL.format(blue_result, duration, red_result)
+        if match.lpl else
+        BOX_RESULTS.format(blue_result, match.patch, duration, red_result),
+        BOX_SEPARATOR,
+        BOX_STATS_HEADER,
+    ]
     # Iterrate through all players in the game.
-    for i in range(0, 5):
-        j = i + 5
-        output += (u'\x1b[1;36;40m{0}\x1b[m \u2502 '
-                   u'\x1b[1;31;40m{1}\x1b[m\n').format(
-            stats_first(data['participants'][i]['stats'], data['players'][i]),
-            stats_first(data['participants'][j]['stats'], data['players'][j]),
-        )
-        output += (u'{0} \u2502 {1}\n').format(
-            stats_second(data['participants'][i],
-                         champions, data['max_damage']),
-            stats_second(data['participants'][j],
-                         champions, data['max_damage']),
-        )
-
-    output += (u'\u2500' * 19) + u'\u253c' + (u'\u2500' * 19) + '\n'
+    for blue_player, red_player in zip(blue_players, red_players):
+        lines.append(BOX_PLAYERS.format(
+            stats_first(blue_player), stats_first(red_player)))
+        lines.append(BOX_CHAMPIONS.format(
+            stats_second(blue_player, champions, max_damage),
+            stats_second(red_player, champions, max_damage)))
+    lines.append(BOX_SEPARATOR)
 
     # Stats like Bans, picks, dragons, barons.
-    output += u'{0} {1} {2} {3} \u2502 {0} {4} {5} {6}\n'.format(
-        u'\u7981\u7528',
-        textual_width_fill(data['blue_bans'][0], 10),
-        textual_width_fill(data['blue_bans'][1], 10),
-        textual_width_fill(data['blue_bans'][2], 10),
-        textual_width_fill(data['red_bans'][0], 10),
-        textual_width_fill(data['red_bans'][1], 10),
-        textual_width_fill(data['red_bans'][2], 10),
-        )
-    output += u'{0} {1} {2} {3} \u2502 {0} {4} {5}\n'.format(
-        ' ' * 4,
-        textual_width_fill(data['blue_bans'][3], 10),
-        textual_width_fill(data['blue_bans'][4], 10),
-        ' ' * 10,
-        textual_width_fill(data['red_bans'][3], 10),
-        textual_width_fill(data['red_bans'][4], 10),
-        )
-    output += u'{0} {1} \u2502 {0} {2}\n'.format(
-        u'\u5c0f\u9f8d', data['blue_dragons'], data['red_dragons']
-    )
-    if lpl:
-        output += (u'{0:>2} \u5854 / {1:>2} \u5df4\u9f8d{2}').format(
-            data['team_blue']['towerKills'],
-            data['team_blue']['baronKills'],
-            ' ' * 22
-        )
-        output += u' \u2502 '
-        output += (u'{0:>2} \u5854 / {1:>2} \u5df4\u9f8d\n').format(
-            data['team_red']['towerKills'],
-            data['team_red']['baronKills'],
-        )
+    lines.append(BOX_BANS.format(*(blue_bans[:3] + red_bans[:3])))
+    lines.append(BOX_BANS_SECOND.format(*(blue_bans[3:] + red_bans[3:])))
+    lines.append(BOX_DRAGONS.format(blue_dragons, red_dragons))
+    if match.lpl:
+        lines.append(BOX_OBJECTIVES_LPL.format(
+            blue.towers, blue.barons, red.towers, red.barons))
     else:
-        output += (u'{0:>2} \u5854 / {1} \u5175\u71df / '
-                   u'{2} \u9810\u793a\u8005 / {3:>2} \u5df4\u9f8d  ').format(
-            data['team_blue']['towerKills'],
-            data['team_blue']['inhibitorKills'],
-            data['team_blue']['riftHeraldKills'],
-            data['team_blue']['baronKills'],
-        )
-        output += u' \u2502 '
-        output += (u'{0:>2} \u5854 / {1} \u5175\u71df / '
-                   u'{2} \u9810\u793a\u8005 / {3:>2} \u5df4\u9f8d\n').format(
-            data['team_red']['towerKills'],
-            data['team_red']['inhibitorKills'],
-            data['team_red']['riftHeraldKills'],
-            data['team_red']['baronKills'],
-        )
-    if short_url:
-        output += ((u'\u2500' * 19) + u'\u2534' +
-                   (u'\u2500' * 6) + '{0:>26}\n\n').format(
-            short_url)
+        lines.append(BOX_OBJECTIVES.format(
+            blue.towers, blue.inhibitors, blue.heralds, blue.barons,
+            red.towers, red.inhibitors, red.heralds, red.barons))
+    graph = gold_graph(match.timeline, match.duration) \
+        if match.timeline is not None else None
+    if graph:
+        lines.append(BOX_GRAPH_SEPARATOR)
+        lines.extend(graph)
+        lines.append(BOX_GRAPH_FOOTER_URL.format(short_url)
+                     if short_url else BOX_GRAPH_FOOTER)
     else:
-        output += (u'\u2500' * 19) + u'\u2534' + (u'\u2500' * 19) + '\n\n'
-    return output
+        lines.append(
+            BOX_FOOTER_URL.format(short_url) if short_url else BOX_FOOTER)
+    return u''.join(lines)
+
+
+# The line templates of the summary box.
+SUMMARY_HEADER = (u'\x1b[1;37;46m \u7e3d\u8a08 {0:>3} \u5834 \x1b[m ' +
+                  (u'\u2500' * 32) + '\n')
+SUMMARY_TEAMS_HEADER = (
+    u'\x1b[1;37;40m\u968a\u4f0d' + u' ' * 15 + u'\u5834  \u52dd-\u6557'
+    u'   \u64ca\u6bba    \u6b7b\u4ea1 \u7d93\u6fdf/\u5206'
+    u'   \u6642\u9593\x1b[m\n')
+SUMMARY_TEAM = (u'{0}{1:>3} {2:>3}-{3:<3} {4:>5.1f} {5:>5.1f} '
+                u'{6:>7.0f}  {7:>5}\n')
+SUMMARY_PLAYERS_HEADER = (
+    u'\x1b[1;37;40m\u9078\u624b' + u' ' * 15 + u'\u5834    K    D    A'
+    u'   KDA  CS/\u5206  \u50b7\u5bb3%  \u7d93\u6fdf%\x1b[m\n')
+SUMMARY_PLAYER = (u'\x1b[1;36;40m{0}\x1b[m{1:>3} {2:>4.1f} {3:>4.1f} '
+                  u'{4:>4.1f} {5:>5.1f} {6:>6.1f} {7:>5.1f}% {8:>5.1f}%\n')
+SUMMARY_SEPARATOR = u'\u2500' * 39 + '\n'
+SUMMARY_FOOTER = u'\u2500' * 39 + '\n\n'
+# The columns totaled for every player and every team.
+PLAYER_TOTALS = ('games', 'kills', 'deaths', 'assists', 'cs', 'gold',
+                 'damage', 'team_gold', 'team_damage', 'minutes')
+TEAM_TOTALS = ('games', 'wins', 'kills', 'deaths', 'gold', 'minutes')
+
+
+def _total_by(keys, columns):
+    '''
+    Sum the rows of columns sharing the same key, in one pass. Returns the
+    keys in the order they first appear, and their totals.
+    '''
+    import numpy as np
 
+    unique, first, inverse = np.unique(
+        keys, return_index=True, return_inverse=True)
+    totals = np.zeros((len(unique), columns.shape[1]))
+    np.add.at(totals, inverse.ravel(), columns)
+    order = np.argsort(first, kind='stable')
+    return unique[order].tolist(), totals[order]
+
+
+def summarize_matches(matches):
+    '''
+    Total up the stats of every player and every team over matches. The
+    games are laid out as arrays, with a row per player (or team) per game,
+    and totaled by name at once. Returns two lists of (name, totals), with
+    totals a dict of PLAYER_TOTALS or TEAM_TOTALS.
+    '''
+    import numpy as np
+
+    # games x sides x players x (kills, deaths, assists, cs, gold, damage)
+    stats = np.array([
+        (player.kills, player.deaths, player.assists, player.cs,
+         player.gold, player.damage)
+        for match in matches for player in match.players
+    ], dtype=np.float64).reshape(len(matches), 2, 5, 6)
+    minutes = np.array(
+        [match.duration for match in matches], dtype=np.float64) / 60
+    team_stats = stats.sum(axis=2)
+    ones = np.ones(stats.shape[:3] + (1,))
+
+    player_columns = np.concatenate([
+        ones,
+        stats,
+        np.broadcast_to(team_stats[:, :, None, 4:6], stats.shape[:3] + (2,)),
+        np.broadcast_to(minutes[:, None, None, None], ones.shape),
+    ], axis=-1).reshape(-1, len(PLAYER_TOTALS))
+    players = _total_by(
+        [player.name for match in matches for player in match.players],
+        player_columns)
+
+    team_columns = np.concatenate([
+        ones[:, :, 0],
+        np.array([(match.blue.win, match.red.win) for match in matches],
+                 dtype=np.float64)[:, :, None],
+        team_stats[:, :, [0, 1, 4]],
+        np.broadcast_to(minutes[:, None, None], ones[:, :, 0].shape),
+    ], axis=-1).reshape(-1, len(TEAM_TOTALS))
+    teams = _total_by(
+        [team.name or match.players[side * 5].name.split(' ')[0]
+         for match in matches
+         for side, team in enumerate((match.blue, match.red))],
+        team_columns)
+    return [
+        [(name, dict(zip(fields, row.tolist())))
+         for name, row in zip(names, totals)]
+        for (names, totals), fields in (
+            (players, PLAYER_TOTALS), (teams, TEAM_TOTALS))
+    ]
+
+
+def output_summary(matches):
+    '''
+    Output a box of the per-team and per-player totals and rates of
+    matches: K/D/A per game, KDA, CS per minute, and the share of the
+    damage and gold of their team.
+    '''
+    print('* Preparing summary...')
+    players, teams = summarize_matches(matches)
+    lines = [SUMMARY_HEADER.format(len(matches)), SUMMARY_TEAMS_HEADER]
+    for name, team in teams:
+        m, s = divmod(int(round(team['minutes'] * 60 / team['games'])), 60)
+        lines.append(SUMMARY_TEAM.format(
+            textual_width_fill(name, 18), int(team['games']),
+            int(team['wins']), int(team['games'] - team['wins']),
+            team['kills'] / team['games'], team['deaths'] / team['games'],
+            team['gold'] / team['minutes'], '{0:02d}:{1:02d}'.format(m, s)))
+    lines.append(SUMMARY_SEPARATOR)
+    lines.append(SUMMARY_PLAYERS_HEADER)
+    for name, player in players:
+        games = player['games']
+        lines.append(SUMMARY_PLAYER.format(
+            textual_width_fill(name, 18), int(games),
+            player['kills'] / games, player['deaths'] / games,
+            player['assists'] / games,
+            (player['kills'] + player['assists']) /
+            max(player['deaths'], 1),
+            player['cs'] / player['minutes'],
+            player['damage'] * 100 / (player['team_damage'] or 1),
+            player['gold'] * 100 / (player['team_gold'] or 1)))
+    lines.append(SUMMARY_FOOTER)
+    return u''.join(lines)
 
-def get_match_result(url_match, champions, game_number, teams, shortener, session):
+
+class URLShortener(object):
+    '''
+    Shorten URLs with bitly on a few background threads, so it overlaps with
+    fetching the games. Short URLs never change, so they are kept in a
+    persistent cache, and only the cache is used in offline mode.
+    '''
+
+    def __init__(self, bitly_token, path, offline):
+        self.bitly_token = bitly_token
+        self.offline = offline
+        self.cache = TTLCache(path=path)
+        self._shortener = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def shorten(self, url):
+        '''
+        Return a future of the short URL, empty if offline and not cached.
+        '''
+        from concurrent.futures import Future, ThreadPoolExecutor
+        if self.offline:
+            future = Future()
+            future.set_result(self.cache.peek(url) or '')
+            return future
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=SHORTENER_WORKERS)
+        return self._executor.submit(
+            self.cache.get, url, functools.partial(self._bitly_short, url))
+
+    def _bitly_short(self, url):
+        print('* Shorten URL...')
+        with self._lock:
+            if self._shortener is None:
+                from pyshorteners import Shortener
+                self._shortener = Shortener(
+                    api_key=self.bitly_token, timeout=5)
+        with PROFILER.stage('shorten url'):
+            return self._shortener.bitly.short(url)
+
+
+def get_match_result(url_match, garena, teams, shortener, session,
+                     riot_auth, response_cache, offline, graph=False,
+                     archive_dir='', hedger=None):
 
     game_hash = url_match.group('hash')
-    garena = url_match.group('site').startswith(
-        ('id', 'ph', 'sg', 'tw', 'th', 'vn')
-    )
     normalized_url = ('https://matchhistory.{0}/{1}/#match-details/'
                       '{2}/{3}{4}').format(
         url_match.group('site'), url_match.group('lang'),
         url_match.group('server'), url_match.group('id1'),
         url_match.group('id2'))
 
-    short_url = ''
-    if shortener:
-        print('* Shorten URL...')
-        short_url = shortener.bitly.short(normalized_url)
+    # Shorten the URL in the background while fetching the match.
+    short_url = shortener.shorten(normalized_url) if shortener else None
 
-    ##########################################
-    # Fetch the match history and analyze it.
-    print('* Fetching matching history...')
     json_url = ('https://{0}.leagueoflegends.com'
                 '/v1/stats/game/{1}/{2}{3}').format(
                     'acs-garena' if garena else 'acs',
                     url_match.group('server'),
                     url_match.group('id1'),
                     '?gameHash={0}'.format(game_hash) if game_hash else '')
-    print(json_url)
-    res = session.get(json_url)
-    match_history = res.json()
-
-    # Get timeline history. Maybe we can add graph at future.
-    # It is the only way we can get the dragon types :(
-    print('* Getting timeline data...')
     json_timeline_url = ('https://{0}.leagueoflegends.com'
                          '/v1/stats/game/{1}/{2}/timeline{3}').format(
                             'acs-garena' if garena else 'acs',
@@ -230,103 +1470,99 @@ def get_match_result(url_match, champions, game_number, teams, shortener, sessio
                             url_match.group('id1'),
                             '?gameHash={0}'.format(
                                 game_hash) if game_hash else '')
-    res = session.get(json_timeline_url)
-    timeline = res.json()
+    cache_key = '{0}/{1}/{2}'.format(
+        url_match.group('server'), url_match.group('id1'), game_hash or '')
+    deadline = hedger.deadline() if hedger else None
+    # Get the timeline at the same time as the match history.
+    if hedger and not offline and \
+            not response_cache.has(cache_key + '/timeline'):
+        hedger.prefetch(json_timeline_url, deadline,
+                        riot_auth.generation if riot_auth else 0)
+
+    try:
+        ##########################################
+        # Fetch the match history and analyze it.
+        print('* Fetching matching history...')
+        print(json_url)
+        with PROFILER.stage('match history'):
+            match_history = fetch_cached_json(
+                session, json_url, cache_key + '/match', response_cache,
+                offline, riot_auth, hedger, deadline)
+
+        # Get timeline history, for the gold graph and the archive.
+        # It is the only way we can get the dragon types :(
+        print('* Getting timeline data...')
+        # Without the graph and the archive only the dragon events are
+        # needed, so the timeline is scanned as it is downloaded instead of
+        # being parsed as a whole.
+        timeline = None
+        with PROFILER.stage('timeline'):
+            if graph or archive_dir:
+                timeline = parse_timeline(fetch_cached_json(
+                    session, json_timeline_url, cache_key + '/timeline',
+                    response_cache, offline, riot_auth, hedger, deadline))
+                dragon_kills = timeline.dragon_kills
+            else:
+                dragon_kills = get_dragon_kills(iter_cached_response(
+                    session, json_timeline_url, cache_key + '/timeline',
+                    response_cache, offline, riot_auth, hedger, deadline))
+    finally:
+        if hedger:
+            hedger.discard(json_timeline_url)
 
     ##########################################
     # Output!
 
-    data = dict()
-    # Some data that needs to be prepared.
-    data['patch_ver'] = re.search(
-        r'^[0-9]+\.[0-9]+', match_history['gameVersion']).group(0)
-    m, s = divmod(match_history['gameDuration'], 60)
-    data['duration'] = '{0:02d}:{1:02d}'.format(m, s)
-    data['game_date'] = datetime.datetime.fromtimestamp(
-        match_history['gameCreation'] / 1000).strftime('%Y-%m-%d')
-    data['players'] = [
-        identity['player']['summonerName']
-        for identity in match_history['participantIdentities']
-    ]
-    team_dict = dict(teams)
-    data['blue_team_name'] = team_dict.get(
-        data['players'][0].split(' ')[0], '')
-    data['red_team_name'] = team_dict.get(
-        data['players'][5].split(' ')[0], '')
-    blue_kills = 0
-    blue_golds = 0
-    red_kills = 0
-    red_golds = 0
-    max_damage = 0
-    for i in range(0, 5):
-        stats = match_history['participants'][i]['stats']
-        blue_kills += stats['kills']
-        blue_golds += stats['goldEarned']
-        max_damage = max(
-            max_damage,
-            stats['totalDamageDealtToChampions'])
-    for i in range(5, 10):
-        stats = match_history['participants'][i]['stats']
-        red_kills += stats['kills']
-        red_golds += stats['goldEarned']
-        max_damage = max(
-            max_damage,
-            stats['totalDamageDealtToChampions'])
-    data['max_damage'] = max_damage
-    data['blue_kills'] = blue_kills
-    data['red_kills'] = red_kills
-    data['blue_golds'] = blue_golds
-    data['red_golds'] = red_golds
-    data['blue_golds'] = '{}k'.format(round(blue_golds / 100.00) / 10)
-    data['red_golds'] = '{}k'.format(round(red_golds / 100.00) / 10)
-    data['blue_result'] = (
-        VICTORY_MSG
-        if match_history['teams'][0]['win'] == 'Win'
-        else DEFEAT_MSG
+    players = tuple(
+        Player(
+            identity['player']['summonerName'],
+            participant['championId'],
+            participant['stats']['kills'],
+            participant['stats']['deaths'],
+            participant['stats']['assists'],
+            participant['stats']['totalMinionsKilled'] +
+            participant['stats']['neutralMinionsKilled'],
+            participant['stats']['goldEarned'],
+            participant['stats']['totalDamageDealtToChampions'])
+        for identity, participant in zip(
+            match_history['participantIdentities'],
+            match_history['participants'])
     )
-    data['red_result'] = (
-        VICTORY_MSG
-        if match_history['teams'][1]['win'] == 'Win'
-        else DEFEAT_MSG
-    )
-    data['blue_bans'] = [
-        champions[ban['championId']]
-        for ban in match_history['teams'][0]['bans']]
-    data['blue_bans'] += [''] * (5 - len(data['blue_bans']))
-    data['red_bans'] = [
-        champions[ban['championId']]
-        for ban in match_history['teams'][1]['bans']]
-    data['red_bans'] += [''] * (5 - len(data['red_bans']))
-
-    blue_dragons = ''
-    blue_dragon_count = 0
-    red_dragons = ''
-    # Get the dragon slain from the timeline.
-    for frame in timeline['frames']:
-        for event in frame['events']:
-            if (event.get('monsterType', '') == 'DRAGON' and
-                    event['killerId'] <= 5):
-                blue_dragons += color_dragon(
-                    event['monsterSubType']
-                )
-                blue_dragon_count += 1
-            elif event.get('monsterType', '') == 'DRAGON':
-                red_dragons += color_dragon(
-                    event['monsterSubType']
-                )
-    blue_dragons += ' ' * (32 - blue_dragon_count * 2)
-    data['blue_dragons'] = blue_dragons
-    data['red_dragons'] = red_dragons
-    data['participants'] = match_history['participants']
-    data['team_blue'] = match_history['teams'][0]
-    data['team_red'] = match_history['teams'][1]
-
-    return output_match_result(data, game_number, short_url, champions)
-
-
-def get_lpl_teams():
+    team_dict = dict(teams)
+    sides = []
+    for i, team in enumerate(match_history['teams']):
+        sides.append(Team(
+            team_dict.get(players[i * 5].name.split(' ')[0], ''),
+            team['win'] == 'Win',
+            [ban['championId'] for ban in team['bans']],
+            # Get the dragon slain from the timeline.
+            tuple(
+                monster_sub_type
+                for killer_id, monster_sub_type in dragon_kills
+                if (killer_id <= 5) == (i == 0)),
+            team['towerKills'],
+            team['inhibitorKills'],
+            team['riftHeraldKills'],
+            team['baronKills']))
+    match = Match(
+        datetime.datetime.fromtimestamp(
+            match_history['gameCreation'] / 1000).strftime('%Y-%m-%d'),
+        match_history['gameDuration'],
+        re.search(r'^[0-9]+\.[0-9]+', match_history['gameVersion']).group(0),
+        False, sides[0], sides[1], players, timeline if graph else None)
+    if archive_dir:
+        with PROFILER.stage('archive'):
+            archive_game(archive_dir, '{0}-{1}'.format(
+                url_match.group('server'), url_match.group('id1')),
+                match, timeline)
+
+    match.short_url = short_url.result() if short_url else ''
+    return match
+
+
+def fetch_lpl_teams(session):
     print("* Get LPL teams...")
-    res = requests.get(
+    res = session.get(
         'http://lpl.qq.com/web201612'
         '/data/LOL_MATCH2_TEAM_LIST.js'
     )
@@ -336,47 +1572,57 @@ def get_lpl_teams():
         for team in six.itervalues(data['msg']))
 
 
-def get_lpl_matches(group_id, shortener):
-    short_url = ''
+def get_lpl_teams(session, cache):
+    with PROFILER.stage('lpl teams'):
+        return cache.get('teams', functools.partial(fetch_lpl_teams, session))
+
+
+class MatchNotReady(Exception):
+    '''
+    Raised for a game of an LPL group that is not finished yet.
+    '''
+
+
+def get_lpl_matches(session, group_id, shortener):
+    '''
+    Return the short URL future (or None) of the group, and its match ids.
+    '''
+    short_url = None
     if shortener:
-        normalized_url = (
-            'http://lpl.qq.com/es/stats.shtml?bmid={0}').format(group_id)
-        print('* Shorten URL...')
-        short_url = shortener.bitly.short(normalized_url)
+        short_url = shortener.shorten(
+            'http://lpl.qq.com/es/stats.shtml?bmid={0}'.format(group_id))
 
-    res = requests.get(
-        ('http://apps.game.qq.com/lol/match/apis/'
-         'searchSMatchList.php?p0={0}&r1=SMatchListArr').format(group_id)
-    )
-    # Dirty way to convert JSONP to json.
-    data = json.loads(res.text.split('=', 1)[1][:-1])
+    with PROFILER.stage('lpl match list'):
+        res = session.get(
+            ('http://apps.game.qq.com/lol/match/apis/'
+             'searchSMatchList.php?p0={0}&r1=SMatchListArr').format(
+                group_id)
+        )
+        # Dirty way to convert JSONP to json.
+        data = json.loads(res.text.split('=', 1)[1][:-1])
     return short_url, (msg['sMatchId'] for msg in data['msg'])
 
 
-def get_match_result_lpl(match_id, champions,
-                         game_number, teams, short_url):
-    lpl_teams = get_lpl_teams()
+def get_match_result_lpl(session, match_id, teams, short_url,
+                         lpl_teams_cache):
+    lpl_teams = get_lpl_teams(session, lpl_teams_cache)
 
     print('* Getting LPL data...')
-    res = requests.get(
-        ('http://apps.game.qq.com/lol/match/apis/'
-         'searchMatchInfo_s.php?p0={0}&r1=MatchInfo').format(match_id)
-    )
-    # Dirty way to convert JSONP to json.
-    msg_data = json.loads(res.text.split('=', 1)[1][:-1])['msg']
-    battle_data = json.loads(msg_data['battleInfo']['BattleData'])
-
-    data = dict()
-    # Some data that needs to be prepared.
-    data['patch_ver'] = ''
-    m, s = divmod(int(battle_data['game-period']), 60)
-    data['duration'] = '{0:02d}:{1:02d}'.format(m, s)
-    data['game_date'] = battle_data['game-date']
-    data['players'] = [
-        p['name'] for p in battle_data['left']['players']
-    ] + [
-        p['name'] for p in battle_data['right']['players']
-    ]
+    with PROFILER.stage('lpl match'):
+        res = session.get(
+            ('http://apps.game.qq.com/lol/match/apis/'
+             'searchMatchInfo_s.php?p0={0}&r1=MatchInfo').format(match_id)
+        )
+        # Dirty way to convert JSONP to json.
+        msg_data = json.loads(res.text.split('=', 1)[1][:-1])['msg']
+    # The battle data is only there once the game is finished.
+    battle_info = msg_data.get('battleInfo') or {}
+    if not battle_info.get('BattleData'):
+        raise MatchNotReady(match_id)
+    battle_data = json.loads(battle_info['BattleData'])
+    if battle_data.get('game-win') not in ('left', 'right'):
+        raise MatchNotReady(match_id)
+
     match_info = msg_data['sMatchInfo']
     blue_team = match_info['BlueTeam']
     red_team = (
@@ -385,101 +1631,95 @@ def get_match_result_lpl(match_id, champions,
         else match_info['TeamA']
     )
     team_dict = dict(teams)
-    data['blue_team_name'] = team_dict.get(
-        lpl_teams[blue_team], lpl_teams[blue_team])
-    data['red_team_name'] = team_dict.get(
-        lpl_teams[red_team], lpl_teams[red_team])
-
-    blue_kills = 0
-    blue_golds = 0
-    red_kills = 0
-    red_golds = 0
-    max_damage = 0
-    for player in battle_data['left']['players']:
-        blue_kills += int(player['kill'])
-        blue_golds += int(player['gold'])
-        max_damage = max(
-            max_damage,
-            int(player['totalDamageToChamp']))
-    for player in battle_data['right']['players']:
-        red_kills += int(player['kill'])
-        red_golds += int(player['gold'])
-        max_damage = max(
-            max_damage,
-            int(player['totalDamageToChamp']))
-
-    data['max_damage'] = max_damage
-    data['blue_kills'] = blue_kills
-    data['red_kills'] = red_kills
-    data['blue_golds'] = blue_golds
-    data['red_golds'] = red_golds
-    data['blue_golds'] = '{}k'.format(round(blue_golds / 100.00) / 10)
-    data['red_golds'] = '{}k'.format(round(red_golds / 100.00) / 10)
-    data['blue_result'] = (
-        VICTORY_MSG
-        if battle_data['game-win'] == 'left'
-        else DEFEAT_MSG
-    )
-    data['red_result'] = (
-        VICTORY_MSG
-        if battle_data['game-win'] == 'right'
-        else DEFEAT_MSG
-    )
-    # For LPL match history, empty ban is presented as champion id zero.
-    blue_bans = [
-        int(battle_data['left']['ban-hero-{0}'.format(i)])
-        for i in range(1, 6)]
-    red_bans = [
-        int(battle_data['right']['ban-hero-{0}'.format(i)])
-        for i in range(1, 6)]
-    data['blue_bans'] = [
-        champions[b] if b != 0 else ''
-        for b in blue_bans
-    ]
-    data['red_bans'] = [
-        champions[b] if b != 0 else ''
-        for b in red_bans
-    ]
-    data['blue_dragons'] = '{0:<32}'.format(battle_data['left']['s-dragon'])
-    data['red_dragons'] = battle_data['right']['s-dragon']
-
-    data['participants'] = []
-    for player in (battle_data['left']['players'] +
-                   battle_data['right']['players']):
-        participant = {
-             'championId': int(player['hero']),
-             'stats': {
-                 'totalDamageDealtToChampions': int(
-                     player['totalDamageToChamp']),
-                 'kills': int(player['kill']),
-                 'deaths': int(player['death']),
-                 'assists': int(player['assist']),
-                 'totalMinionsKilled': int(player['lasthit']),
-                 'neutralMinionsKilled': 0,
-                 'goldEarned': int(player['gold'])
-             }
-        }
-        data['participants'].append(participant)
-
-    data['team_blue'] = {
-        'towerKills': battle_data['left']['tower'],
-        'inhibitorKills': 0,
-        'riftHeraldKills': 0,
-        'baronKills': battle_data['left']['b-dragon']
-    }
-    data['team_red'] = {
-        'towerKills': battle_data['right']['tower'],
-        'inhibitorKills': 0,
-        'riftHeraldKills': 0,
-        'baronKills': battle_data['right']['b-dragon']
-    }
-    return output_match_result(data, game_number, short_url, champions, True)
-
-
-def sign_in_with_riot():
-    username = input('Your Riot Username: ')
+    sides = []
+    players = []
+    for side, team in (('left', blue_team), ('right', red_team)):
+        side_data = battle_data[side]
+        players.extend(
+            Player(
+                player['name'],
+                int(player['hero']),
+                int(player['kill']),
+                int(player['death']),
+                int(player['assist']),
+                int(player['lasthit']),
+                int(player['gold']),
+                int(player['totalDamageToChamp']))
+            for player in side_data['players'])
+        # For LPL match history, empty ban is presented as champion id zero.
+        sides.append(Team(
+            team_dict.get(lpl_teams[team], lpl_teams[team]),
+            battle_data['game-win'] == side,
+            [int(side_data['ban-hero-{0}'.format(i)]) for i in range(1, 6)],
+            side_data['s-dragon'],
+            side_data['tower'], 0, 0,
+            side_data['b-dragon']))
+    return Match(
+        battle_data['game-date'], int(battle_data['game-period']), '', True,
+        sides[0], sides[1], tuple(players),
+        short_url=short_url.result() if short_url else '')
+
+
+def fetch_boxes(jobs, workers):
+    '''
+    Run every box job, using a thread pool when workers > 1.
+    The boxes are returned in the same order as the jobs.
+    '''
+    if workers <= 1 or len(jobs) <= 1:
+        return [job() for job in jobs]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(job) for job in jobs]
+        return [future.result() for future in futures]
+
+
+# A game fetched by a box job, and its box.
+GameBox = collections.namedtuple('GameBox', ('match', 'box'))
+
+
+def render_game(get_match, game_number, champions):
+    '''
+    Fetch a game with one of the adapters, and render its box.
+    '''
+    match = get_match()
+    with PROFILER.stage('output match result'):
+        return GameBox(match, output_match_result(
+            match, game_number, match.short_url, champions))
+
+
+def render_if_ready(job):
+    '''
+    Run a box job, None if the game is not finished yet.
+    '''
+    try:
+        return job()
+    except MatchNotReady as e:
+        print('* LPL game {0} is not finished yet.'.format(e))
+        return None
+
+
+def input_from_terminal(prompt):
+    '''
+    Ask on the terminal like getpass does, instead of stdin, which may be
+    the series list of --batch -.
+    '''
+    try:
+        terminal = io.open('/dev/tty', 'r+')
+    except (IOError, OSError):
+        if not sys.stdin.isatty():
+            raise click.ClickException(
+                'There is no terminal to ask for the Riot username, sign in '
+                'once from a terminal to save the session.')
+        return input(prompt)
+    with terminal:
+        terminal.write(six.text_type(prompt))
+        terminal.flush()
+        return terminal.readline().rstrip('\n')
+
+
+def sign_in_with_riot(session):
+    username = input_from_terminal('Your Riot Username: ')
     password = getpass('Your Riot Password: ')
-    session = requests.Session()
     resp = session.get('https://login.leagueoflegends.com/')
     resp.raise_for_status()
 
@@ -502,6 +1742,534 @@ def sign_in_with_riot():
     return session
 
 
+class RiotAuth(object):
+    '''
+    Keep the Riot sign-in of a session. The cookies are saved to path (only
+    readable by the user) with their expiry, so later runs can reuse them
+    without asking for the password. They are only replaced after the
+    server rejects them.
+    '''
+
+    def __init__(self, session, path):
+        self.session = session
+        self.path = path
+        self.signed_in = False
+        # Bumped on every sign-in, so concurrent rejections sign in once.
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def ensure(self):
+        with self._lock:
+            if not self.signed_in:
+                if self.load():
+                    print('* Reusing the saved Riot session...')
+                else:
+                    self._sign_in()
+                self.signed_in = True
+
+    def refresh(self, generation):
+        '''
+        Sign in again after the server rejected the cookies, unless another
+        thread already did so since the rejected request was sent.
+        '''
+        with self._lock:
+            if generation == self.generation:
+                print('* The Riot session was rejected, please sign in again.')
+                self.session.cookies.clear()
+                self._sign_in()
+                self.signed_in = True
+
+    def _sign_in(self):
+        with PROFILER.stage('sign in with riot'):
+            sign_in_with_riot(self.session)
+        self.generation += 1
+        self.save()
+
+    def load(self):
+        if not self.path:
+            return False
+        from requests.cookies import create_cookie
+        cookies = read_json_file(self.path) or []
+        now = time.time()
+        loaded = False
+        for cookie in cookies:
+            if cookie['expires'] is not None and cookie['expires'] <= now:
+                continue
+            self.session.cookies.set_cookie(create_cookie(
+                cookie['name'], cookie['value'], domain=cookie['domain'],
+                path=cookie['path'], expires=cookie['expires'],
+                secure=cookie['secure']))
+            loaded = True
+        return loaded
+
+    def save(self):
+        if not self.path:
+            return
+        write_json_file(self.path, [
+            {
+                'name': cookie.name,
+                'value': cookie.value,
+                'domain': cookie.domain,
+                'path': cookie.path,
+                'expires': cookie.expires,
+                'secure': cookie.secure,
+            }
+            for cookie in self.session.cookies
+        ])
+        os.chmod(self.path, 0o600)
+
+
+def copy_to_clipboard(output):
+    import platform
+    import pyperclip
+    copy = pyperclip.copy
+    # https://github.com/asweigart/pyperclip/pull/168
+    if platform.system() == 'Linux':
+        with open('/proc/version', 'r') as f:
+            if "microsoft" in f.read().lower():
+                copy, _ = pyperclip.init_wsl_clipboard()
+    copy(output)
+
+
+class BoxContext(object):
+    '''
+    The warm state shared by every box rendered in this process: the HTTP
+    session (signed in to Riot once needed), champion table and caches.
+    '''
+
+    def __init__(self, workers, cache_dir, cache_size, offline, bitly_token,
+                 graph=False, archive_dir='',
+                 game_budget=DEFAULT_GAME_BUDGET, profile=False):
+        self.workers = workers
+        self.graph = graph
+        self.archive_dir = archive_dir
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.session = create_http_session(workers, profile)
+        self.load_champions()
+        self.lpl_teams_cache = TTLCache(
+            LPL_TEAMS_TTL,
+            os.path.join(cache_dir, 'lpl_teams.json') if cache_dir else '')
+        self.response_cache = ResponseCache(
+            os.path.join(cache_dir, 'responses') if cache_dir else '',
+            cache_size * 1024 * 1024)
+        self.shortener = None
+        if bitly_token:
+            self.shortener = URLShortener(
+                bitly_token,
+                os.path.join(cache_dir, 'short_urls.json')
+                if cache_dir else '',
+                offline)
+        self.riot_auth = RiotAuth(
+            self.session,
+            os.path.join(cache_dir, 'riot_session.json') if cache_dir else '')
+        self.hedger = HedgedRequests(self.session, game_budget)
+        self._matches = collections.OrderedDict()
+        self._matches_lock = threading.Lock()
+
+    def load_champions(self):
+        with PROFILER.stage('champions'):
+            self.champions = get_champions(
+                self.session, self.cache_dir, self.offline)
+        self.champions_loaded = time.time()
+
+    def refresh(self):
+        '''
+        Reload the champion table of a long-running process once the
+        cached patch may be outdated.
+        '''
+        if time.time() - self.champions_loaded >= DDRAGON_PATCH_TTL:
+            self.load_champions()
+
+    def sign_in(self):
+        if not self.offline:
+            self.riot_auth.ensure()
+
+    def get_match(self, key, teams, get_match):
+        '''
+        Fetch the game of key once, even when several jobs, series or
+        requests ask for it at the same time; they all get the same Match.
+        The last MATCH_MEMO_SIZE games are kept, but not the failed ones,
+        like the LPL games not finished yet.
+        '''
+        from concurrent.futures import Future
+        memo_key = (key, teams)
+        with self._matches_lock:
+            future = self._matches.get(memo_key)
+            fetching = future is None
+            if fetching:
+                future = self._matches[memo_key] = Future()
+                if len(self._matches) > MATCH_MEMO_SIZE:
+                    self._matches.popitem(last=False)
+        if fetching:
+            try:
+                future.set_result(get_match())
+            except BaseException as e:
+                with self._matches_lock:
+                    if self._matches.get(memo_key) is future:
+                        del self._matches[memo_key]
+                future.set_exception(e)
+        return future.result()
+
+
+# The sites the URLs can come from: name -> (compiled pattern, resolve).
+# resolve(context, url_match, teams) returns the (key, get_match) of every
+# game of a URL, where the key names the game whatever URL it was found
+# in, and get_match() returns its Match.
+SITE_ADAPTERS = collections.OrderedDict()
+RIOT_MATCH_PATH = (
+    r'\/(?P<lang>[a-z]+)\/#match-details\/(?P<server>[0-9A-Z]+)\/'
+    r'(?P<id1>[0-9]+)(?P<id2>\/[0-9]+|\?gameHash=(?P<hash>[0-9a-z]+))'
+)
+
+
+def site_adapter(name, pattern):
+    '''
+    Register the decorated function as the resolve of the URLs matching
+    pattern.
+    '''
+    def register(resolve):
+        SITE_ADAPTERS[name] = (re.compile(pattern), resolve)
+        return resolve
+    return register
+
+
+def riot_games(context, url_match, teams, garena):
+    context.sign_in()
+    key = '{0}/{1}'.format(url_match.group('server'), url_match.group('id1'))
+    return [(key, functools.partial(
+        get_match_result, url_match, garena, teams, context.shortener,
+        context.session, context.riot_auth, context.response_cache,
+        context.offline, context.graph, context.archive_dir,
+        context.hedger))]
+
+
+@site_adapter(
+    'riot',
+    r'^https?://matchhistory\.'
+    r'(?P<site>(?!(?:id|ph|sg|tw|th|vn)\.)[a-z]+\.leagueoflegends\.com)' +
+    RIOT_MATCH_PATH)
+@site_adapter(
+    'korea',
+    r'^https?://matchhistory\.(?P<site>leagueoflegends\.co\.kr)' +
+    RIOT_MATCH_PATH)
+def resolve_riot(context, url_match, teams):
+    return riot_games(context, url_match, teams, False)
+
+
+# Garena servers have their own acs host.
+@site_adapter(
+    'garena',
+    r'^https?://matchhistory\.'
+    r'(?P<site>(?:id|ph|sg|tw|th|vn)\.leagueoflegends\.com)' +
+    RIOT_MATCH_PATH)
+def resolve_garena(context, url_match, teams):
+    return riot_games(context, url_match, teams, True)
+
+
+@site_adapter(
+    'lpl', r'^http://lpl\.qq\.com\/es\/stats\.shtml\?bmid=(?P<bmid>[0-9]+)$')
+@site_adapter(
+    'lpl_old',
+    r'^http://lol\.qq\.com\/match\/match_data\.shtml\?bmid=(?P<bmid>[0-9]+)$')
+def resolve_lpl(context, url_match, teams):
+    if context.offline:
+        raise click.ClickException('LPL games cannot be rendered offline.')
+    # For LPL, we should fetch every matches in the group.
+    short_url, matches = get_lpl_matches(
+        context.session, url_match.group('bmid'), context.shortener)
+    return [
+        ('lpl/{0}'.format(match_id), functools.partial(
+            get_match_result_lpl, context.session, match_id, teams,
+            short_url, context.lpl_teams_cache))
+        for match_id in matches
+    ]
+
+
+def resolve_games(context, urls, teams):
+    '''
+    Resolve urls into the (key, get_match) of their games, in order. A game
+    listed more than once, directly or in LPL groups, is only kept once.
+    '''
+    games = collections.OrderedDict()
+    resolved = set()
+    for url in urls:
+        for pattern, resolve in SITE_ADAPTERS.values():
+            url_match = pattern.match(url)
+            if url_match:
+                break
+        else:
+            print('* Unknown URL: {0}'.format(url))
+            continue
+        # The same group through the old and the new LPL URLs is only
+        # looked up once.
+        source = (resolve, tuple(sorted(url_match.groupdict().items())))
+        if source in resolved:
+            continue
+        resolved.add(source)
+        for key, get_match in resolve(context, url_match, teams):
+            games.setdefault(key, get_match)
+    return list(games.items())
+
+
+def collect_box_jobs(context, urls, number, teams, rendered=()):
+    '''
+    Return (key, job) of every game in urls, numbered from number. The key
+    is from resolve_games, and games whose key is in rendered are left out.
+    '''
+    jobs = []
+    for key, get_match in resolve_games(context, urls, teams):
+        if key in rendered:
+            continue
+        jobs.append((key, functools.partial(
+            render_game,
+            functools.partial(context.get_match, key, teams, get_match),
+            number + len(jobs), context.champions)))
+    return jobs
+
+
+def render_boxes(context, urls, number, teams, summary=False):
+    '''
+    Render the boxes of every game in urls, numbered from number, and a
+    summary box of all of them if summary.
+    '''
+    # Collect the jobs first, so games can be fetched concurrently.
+    jobs = collect_box_jobs(context, urls, number, teams)
+    # The games are numbered in order: stop at the first one that is not
+    # finished, as the next ones would leave a gap in the numbers.
+    games = list(itertools.takewhile(
+        lambda game: game is not None,
+        fetch_boxes(
+            [functools.partial(render_if_ready, job) for _, job in jobs],
+            context.workers)))
+    output = ''.join(game.box for game in games)
+    if summary and games:
+        output += output_summary([game.match for game in games])
+    return output
+
+
+def watch_boxes(context, urls, number, teams, interval, summary=False):
+    '''
+    Poll the LPL groups in urls every interval seconds until interrupted.
+    Only the games finished since the last poll are fetched; their boxes
+    are appended to the output, which is copied to the clipboard again,
+    followed by a summary box of all the games so far if summary.
+    '''
+    rendered = set()
+    matches = []
+    output = ''
+    clipboard = ''
+    try:
+        while True:
+            jobs = collect_box_jobs(
+                context, urls, number + len(rendered), teams, rendered)
+            boxes = fetch_boxes(
+                [functools.partial(render_if_ready, job) for _, job in jobs],
+                context.workers)
+            new_output = ''
+            for (key, _), game in zip(jobs, boxes):
+                # Keep the numbering stable: stop at the first game that is
+                # not finished, it will be numbered in a later poll.
+                if game is None:
+                    break
+                rendered.add(key)
+                matches.append(game.match)
+                new_output += game.box
+            if new_output:
+                print(new_output)
+                output += new_output
+                clipboard = output
+                if summary:
+                    summary_box = output_summary(matches)
+                    print(summary_box)
+                    clipboard += summary_box
+                with PROFILER.stage('copy to clipboard'):
+                    copy_to_clipboard(clipboard)
+                print('Copied to clipboard! {0} games so far.'.format(
+                    len(rendered)))
+            print('* Waiting {0}s for new games, Ctrl-C to stop...'.format(
+                interval))
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    return clipboard
+
+
+def iter_batch_series(lines):
+    '''
+    Yield the series of a batch file: one per line, made of whitespace
+    separated match URLs or bare LPL bmids. Empty lines and lines starting
+    with # are skipped.
+    '''
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield tuple(
+                'http://lpl.qq.com/es/stats.shtml?bmid={0}'.format(token)
+                if token.isdigit() else token
+                for token in line.split())
+
+
+def write_series(context, index, series, number, teams, output_dir,
+                 summary=False):
+    '''
+    Render the games of a series one by one, streaming each box to its own
+    file, then the summary box if summary. The file is only renamed to its
+    final name once complete. Returns the name of the file, the games
+    written and whether the series stopped at a game not finished yet.
+    '''
+    name = '{0:05d}-{1}.txt'.format(
+        index,
+        hashlib.sha1(u' '.join(series).encode('utf-8')).hexdigest()[:8])
+    path = os.path.join(output_dir, name)
+    matches = []
+    unfinished = False
+    try:
+        with io.open(path + '.part', 'w', encoding='utf-8') as f:
+            for _, job in collect_box_jobs(context, series, number, teams):
+                game = render_if_ready(job)
+                # Stop at the first game not finished, as render_boxes does.
+                if game is None:
+                    unfinished = True
+                    break
+                f.write(game.box)
+                f.flush()
+                matches.append(game.match)
+            if summary and matches:
+                f.write(output_summary(matches))
+    except BaseException:
+        os.remove(path + '.part')
+        raise
+    os.replace(path + '.part', path)
+    return name, len(matches), unfinished
+
+
+def run_batch(context, lines, number, teams, output_dir, summary=False):
+    '''
+    Render every series of a batch file into output_dir, a few series at a
+    time. Finished series are recorded in checkpoint.jsonl, so running the
+    same batch again after a failure resumes where it stopped. Returns the
+    series that failed or stopped at a game not finished yet.
+    '''
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    ensure_directory(output_dir)
+    checkpoint_path = os.path.join(output_dir, 'checkpoint.jsonl')
+    done = set()
+    if os.path.exists(checkpoint_path):
+        with io.open(checkpoint_path, 'r', encoding='utf-8') as f:
+            done = set(tuple(json.loads(line)['series'])
+                       for line in f if line.strip())
+    failed = []
+
+    def record(futures):
+        for future in futures:
+            series = futures_series.pop(future)
+            try:
+                name, games, unfinished = future.result()
+            except Exception as e:
+                print(u'* Failed: {0}: {1}'.format(u' '.join(series), e))
+                failed.append(series)
+                continue
+            if unfinished:
+                # Left out of the checkpoint, to be fetched again.
+                print('* Wrote {0} games to {1}, the next one is not '
+                      'finished yet'.format(games, name))
+                failed.append(series)
+                continue
+            print('* Wrote {0} games to {1}'.format(games, name))
+            checkpoint.write(six.text_type(json.dumps({
+                'series': series, 'file': name, 'games': games,
+            })) + u'\n')
+            checkpoint.flush()
+
+    # Bound the series in flight, so the batch is read as it goes.
+    futures_series = {}
+    with ThreadPoolExecutor(max_workers=context.workers) as executor, \
+            io.open(checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+        for index, series in enumerate(iter_batch_series(lines), 1):
+            if series in done:
+                continue
+            if len(futures_series) >= context.workers * 2:
+                finished, _ = wait(
+                    list(futures_series), return_when=FIRST_COMPLETED)
+                record(finished)
+            future = executor.submit(
+                write_series, context, index, series, number, teams,
+                output_dir, summary)
+            futures_series[future] = series
+        record(list(futures_series))
+    return failed
+
+
+def handle_box_request(context, body):
+    '''
+    Render the boxes for a server request body like
+    {"urls": [...], "number": 1, "teams": [["FW", "Flash Wolves"]],
+    "summary": false}.
+    Return the HTTP status and {"output": "..."} or {"error": "..."}.
+    '''
+    try:
+        request = json.loads(body.decode('utf-8'))
+        if not isinstance(request, dict):
+            raise ValueError('the body is not a JSON object')
+        urls = request.get('urls')
+        if not isinstance(urls, list) or not all(
+                isinstance(url, six.string_types) for url in urls):
+            raise ValueError('"urls" is not a list of strings')
+        teams = request.get('teams', [])
+        if not isinstance(teams, list) or not all(
+                isinstance(team, list) and len(team) == 2 and
+                all(isinstance(name, six.string_types) for name in team)
+                for team in teams):
+            raise ValueError('"teams" is not a list of [short, name] pairs')
+        teams = tuple(
+            (six.text_type(short), six.text_type(name))
+            for short, name in teams)
+        number = int(request.get('number', 1))
+        summary = bool(request.get('summary', False))
+    except (ValueError, TypeError) as e:
+        return 400, {'error': 'Bad request: {0}'.format(e)}
+    # Only the request itself is a bad request, not what the sites answer.
+    try:
+        context.refresh()
+        output = render_boxes(context, urls, number, teams, summary)
+    except click.ClickException as e:
+        return 400, {'error': e.format_message()}
+    except Exception as e:
+        return 500, {'error': six.text_type(e)}
+    return 200, {'output': output}
+
+
+def create_box_server(context, port):
+    '''
+    Create a threaded HTTP server on localhost, rendering boxes for every
+    POST to /boxes. The imports are here to keep the start-up fast.
+    '''
+    from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from six.moves.socketserver import ThreadingMixIn
+
+    class BoxRequestHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path == '/boxes':
+                length = int(self.headers.get('Content-Length') or 0)
+                status, data = handle_box_request(
+                    context, self.rfile.read(length))
+            else:
+                status, data = 404, {'error': 'Not found.'}
+            body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    class BoxServer(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    return BoxServer(('127.0.0.1', port), BoxRequestHandler)
+
+
 @click.command()
 @click.option('--number', '-n', type=int, default=1,
               help='The game number of the first match. Default: 1')
@@ -509,65 +2277,111 @@ def sign_in_with_riot():
               help='The team names. e.g. -t FW "Flash Wolves"')
 @click.option('--bitly_token', '-b', type=six.text_type, default=u'',
               help='The bitly generic access token to generate short URLs.')
+@click.option('--workers', '-w', type=click.IntRange(min=1), default=4,
+              help='The number of games to fetch concurrently. Default: 4')
+@click.option('--cache_dir', type=click.Path(file_okay=False),
+              default=DEFAULT_CACHE_DIR,
+              help='Where to cache downloaded data, empty to disable. '
+                   'Default: {0}'.format(DEFAULT_CACHE_DIR))
+@click.option('--cache_size', type=click.IntRange(min=1),
+              default=DEFAULT_RESPONSE_CACHE_MB,
+              help='The size limit of cached match data in MB. '
+                   'Default: {0}'.format(DEFAULT_RESPONSE_CACHE_MB))
+@click.option('--offline', is_flag=True,
+              help='Render the boxes from cached data only, without any '
+                   'network request.')
+@click.option('--profile', is_flag=True,
+              help='Print the time spent in each stage and HTTP request.')
+@click.option('--profile_json', type=click.File('w'),
+              help='Also dump the profile as JSON to this file.')
+@click.option('--serve', type=click.IntRange(min=1, max=65535),
+              metavar='PORT',
+              help='Keep running as a local HTTP server on this port, '
+                   'rendering the boxes POSTed to /boxes.')
+@click.option('--watch', is_flag=True,
+              help='Keep polling the LPL groups for newly finished games.')
+@click.option('--watch_interval', type=click.IntRange(min=1), default=60,
+              help='Seconds between polls in --watch mode. Default: 60')
+@click.option('--game_budget', type=click.IntRange(min=1),
+              default=DEFAULT_GAME_BUDGET,
+              help='Give up on a Riot game not fetched after this many '
+                   'seconds. Default: {0}'.format(DEFAULT_GAME_BUDGET))
+@click.option('--graph', is_flag=True,
+              help='Add a gold lead and objective graph under the box of '
+                   'Riot games. Needs NumPy.')
+@click.option('--summary', is_flag=True,
+              help='Add a box of the team and player totals of all the '
+                   'games (of each series with --batch). Needs NumPy.')
+@click.option('--archive_dir', type=click.Path(file_okay=False),
+              default='',
+              help='Also keep the timeline of every Riot game in this '
+                   'directory as NumPy arrays. Needs NumPy.')
+@click.option('--batch', type=click.File('r'),
+              help='Render every series in this file (- for stdin), one per '
+                   'line as match URLs or LPL bmids, into --output_dir.')
+@click.option('--output_dir', type=click.Path(file_okay=False),
+              default='boxes',
+              help='Where --batch writes a file per series. Default: boxes')
 @click.argument('urls', nargs=-1)
-def main(number, teams, bitly_token, urls):
-    champions = get_champions()
-    # Print and copy to clipboard.
-    output = ''
-    i = number
-    shortener = None
-    riot_session = None
-    if bitly_token:
-        shortener = Shortener(api_key=bitly_token,timeout=5)
-    for url in urls:
-        url_regex = (
-            r'^https?://matchhistory\.(?P<site>[a-z]+\.leagueoflegends\.com|'
-            r'leagueoflegends\.co\.kr)\/(?P<lang>[a-z]+)\/#match-details\/'
-            r'(?P<server>[0-9A-Z]+)\/(?P<id1>[0-9]+)'
-            r'(?P<id2>\/[0-9]+|\?gameHash=(?P<hash>[0-9a-z]+))'
-        )
-        url_match = re.match(url_regex, url)
-        if url_match:
-            if not riot_session:
-                riot_session = sign_in_with_riot()
-            output += get_match_result(url_match, champions, i, teams, shortener, riot_session)
-            i += 1
-        else:
-            lpl_url_regex = (
-                r'^http://lpl\.qq\.com\/es\/stats\.shtml'
-                r'\?bmid=(?P<id>[0-9]+)$'
-            )
-            lpl_old_url_regex = (
-                r'^http://lol\.qq\.com\/match\/match_data\.shtml'
-                r'\?bmid=(?P<id>[0-9]+)$'
-            )
-            lpl_url_match = re.match(lpl_url_regex, url)
-            lpl_old_url_match = re.match(lpl_old_url_regex, url)
-            # For LPL, we should fetch every matches in the group.
-            if lpl_url_match:
-                short_url, matches = get_lpl_matches(lpl_url_match.group('id'), shortener)
-                for match_id in matches:
-                    output += get_match_result_lpl(
-                        match_id, champions, i, teams, short_url)
-                    i += 1
-            elif lpl_old_url_match:
-                short_url, matches = get_lpl_matches(lpl_old_url_match.group('id'), shortener)
-                for match_id in matches:
-                    output += get_match_result_lpl(
-                        match_id, champions, i, teams, short_url)
-                    i += 1
-    print(output)
+def main(number, teams, bitly_token, workers, cache_dir, cache_size, offline,
+         profile, profile_json, serve, watch, watch_interval, game_budget,
+         graph, summary, archive_dir, batch, output_dir, urls):
+    if graph or summary or archive_dir:
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            raise click.UsageError(
+                '{0} needs NumPy: pip install numpy'.format(
+                    '--graph' if graph else
+                    '--summary' if summary else '--archive_dir'))
+    context = BoxContext(
+        workers, cache_dir, cache_size, offline, bitly_token, graph,
+        archive_dir, game_budget, bool(profile or profile_json))
+    if serve:
+        server = create_box_server(context, serve)
+        print('* Serving on http://127.0.0.1:{0}/boxes'.format(serve))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        if profile:
+            print(PROFILER.report())
+        return
 
-    # https://github.com/asweigart/pyperclip/pull/168
-    if platform.system() == 'Linux':
-        with open('/proc/version', 'r') as f:
-            if "microsoft" in f.read().lower():
-                copy, _ = pyperclip.init_wsl_clipboard()    
+    failed = ()
+    if batch:
+        failed = run_batch(
+            context, batch, number, teams, output_dir, summary)
+    elif watch:
+        watch_boxes(context, urls, number, teams, watch_interval, summary)
     else:
-        copy = pyperclip.copy
+        # Print and copy to clipboard.
+        output = render_boxes(context, urls, number, teams, summary)
+        print(output)
+        with PROFILER.stage('copy to clipboard'):
+            copy_to_clipboard(output)
+        print('Copied to clipboard!')
+    lpl_teams_cache = context.lpl_teams_cache
+    if lpl_teams_cache.hits or lpl_teams_cache.misses:
+        print('* LPL team cache: {0} hits, {1} misses'.format(
+            lpl_teams_cache.hits, lpl_teams_cache.misses))
+    if context.hedger.hedged:
+        print('* Hedged {0} slow requests, {1} answered first.'.format(
+            context.hedger.hedged, context.hedger.hedges_won))
+    # Keep the cookies refreshed by the server during this run.
+    if context.riot_auth.signed_in:
+        context.riot_auth.save()
 
-    copy(output)
-    print('Copied to clipboard!')
+    if profile:
+        print(PROFILER.report())
+    if profile_json:
+        json.dump(PROFILER.as_dict(), profile_json, indent=2)
+    if failed:
+        raise click.ClickException(
+            '{0} series failed or are not finished yet, run the same '
+            'batch again to retry them.'.format(len(failed)))
 
 
 if __name__ == '__main__':